@@ -6,6 +6,7 @@ import glob
 import platform
 from src.models.crf_model import CRFModel
 from src.features import FeatureExtractor
+from src.embedding_projection import EmbeddingProjector
 from src.preprocessing import Preprocessor
 
 st.set_page_config(page_title="Türkçe NER Demo", layout="wide")
@@ -209,11 +210,14 @@ def load_internal_model(m_id):
         use_gazetteers=True,
         use_morphology=config.get("use_morphology", True),
         use_embeddings=config.get("use_embeddings", False),
-        embedding_model="dbmdz/bert-base-turkish-cased"
+        embedding_model="dbmdz/bert-base-turkish-cased",
+        embedding_projection=EmbeddingProjector.for_model(m_info["path"])
     )
     # Use Nuve as requested (requires .NET SDK in Docker)
     preprocessor = Preprocessor(engine="nuve")
-    model = CRFModel.load(m_info["path"])
+    # A compact export next to the model loads in milliseconds
+    compact_path = CRFModel.compact_path(m_info["path"])
+    model = CRFModel.load(compact_path if os.path.exists(compact_path) else m_info["path"], extractor)
     return (extractor, preprocessor, model), None
 
 # --- VISUALIZATION ---
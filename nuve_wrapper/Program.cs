@@ -1,6 +1,8 @@
 ﻿using System;
 using System.Collections.Generic;
+using System.IO;
 using System.Linq;
+using System.Text;
 using Nuve.Lang;
 using Nuve.Morphologic.Structure;
 using System.Text.Json;
@@ -9,23 +11,182 @@ namespace NuveWrapper
 {
     class Program
     {
+        const char Control = '\u0001';
+
         static void Main(string[] args)
         {
+            Console.InputEncoding = System.Text.Encoding.UTF8;
+            Console.OutputEncoding = System.Text.Encoding.UTF8;
+
             Language tr = LanguageFactory.Create(LanguageType.Turkish);
 
-            // Batch mode via stdin (JSON input/output for robustness)
+            if (args.Contains("--compact"))
+            {
+                RunCompact(tr);
+                return;
+            }
+
+            // Worker mode via stdin (JSON input/output for robustness).
+            // Every request line gets exactly one response line, in order.
+            // Lines starting with \u0001 are control messages.
+            Console.WriteLine(Control + "READY");
+            Console.Out.Flush();
+
             string line;
             while ((line = Console.ReadLine()) != null)
             {
-                if (string.IsNullOrWhiteSpace(line)) continue;
-                string word = line.Trim();
-                var results = AnalyzeWord(tr, word);
-                Console.WriteLine(JsonSerializer.Serialize(results));
+                if (line.Length > 0 && line[0] == Control)
+                {
+                    string command = line.Substring(1).Trim();
+                    if (command == "QUIT") break;
+                    if (command == "PING") Console.WriteLine(Control + "PONG");
+                }
+                else
+                {
+                    string word = line.Trim();
+                    var results = AnalyzeWord(tr, word);
+                    Console.WriteLine(JsonSerializer.Serialize(results));
+                }
+                Console.Out.Flush();
+            }
+        }
+
+        // Compact binary mode. Every frame is a little-endian u32 length
+        // followed by a payload whose first byte is its kind.
+        //   requests:  'W' + UTF-8 word | 'P' (ping) | 'Q' (quit)
+        //   responses: 'R' ready | 'O' pong
+        //              'M' u32 index, Id, LexicalForm, Type, u8 label count, labels
+        //              'A' u8 status (0 ok, 1 unknown, 2 error), stem,
+        //                  u16 count, count x (u32 index, u8 has_change, surface)
+        // Strings are a u16 byte length followed by UTF-8. Only the best
+        // analysis is sent, and each morpheme is defined once ('M') before
+        // the first analysis that refers to it by index.
+        static void RunCompact(Language tr)
+        {
+            var input = new BinaryReader(Console.OpenStandardInput());
+            var output = new BinaryWriter(new BufferedStream(Console.OpenStandardOutput()));
+            var morphemeIndex = new Dictionary<string, uint>();
+            var frame = new MemoryStream();
+            var writer = new BinaryWriter(frame);
+
+            WriteFrame(output, frame, writer, w => w.Write((byte)'R'));
+            output.Flush();
+
+            while (true)
+            {
+                byte[] payload;
+                try
+                {
+                    uint length = input.ReadUInt32();
+                    payload = input.ReadBytes((int)length);
+                }
+                catch (EndOfStreamException)
+                {
+                    break;
+                }
+                if (payload.Length == 0) continue;
+
+                char kind = (char)payload[0];
+                if (kind == 'Q') break;
+                if (kind == 'P')
+                {
+                    WriteFrame(output, frame, writer, w => w.Write((byte)'O'));
+                }
+                else if (kind == 'W')
+                {
+                    string word = Encoding.UTF8.GetString(payload, 1, payload.Length - 1).Trim();
+                    WriteCompactAnalysis(tr, word, output, frame, writer, morphemeIndex);
+                }
+                output.Flush();
             }
         }
 
+        static void WriteCompactAnalysis(Language tr, string word, BinaryWriter output,
+            MemoryStream frame, BinaryWriter writer, Dictionary<string, uint> morphemeIndex)
+        {
+            Word? best = null;
+            byte status = 1;
+            if (word.Length > 0)
+            {
+                try
+                {
+                    IList<Word> solutions = tr.Analyze(word);
+                    if (solutions.Count > 0)
+                    {
+                        best = solutions[0];
+                        status = 0;
+                    }
+                }
+                catch (Exception)
+                {
+                    status = 2;
+                }
+            }
+
+            // Element type comes from Nuve's Word enumeration
+            var allomorphs = best?.ToList();
+            int count = allomorphs?.Count ?? 0;
+            var indices = new List<uint>();
+            for (int i = 0; i < count; i++)
+            {
+                var allomorph = allomorphs![i];
+                var m = allomorph.Morpheme;
+                var labels = m.Labels.ToList();
+                string key = string.Join("\u001f", new[] { m.Id, m.LexicalForm, m.Type.ToString() }.Concat(labels));
+                if (!morphemeIndex.TryGetValue(key, out uint index))
+                {
+                    index = (uint)morphemeIndex.Count;
+                    morphemeIndex[key] = index;
+                    WriteFrame(output, frame, writer, w =>
+                    {
+                        w.Write((byte)'M');
+                        w.Write(index);
+                        WriteString(w, m.Id);
+                        WriteString(w, m.LexicalForm);
+                        WriteString(w, m.Type.ToString());
+                        w.Write((byte)labels.Count);
+                        foreach (var label in labels) WriteString(w, label);
+                    });
+                }
+                indices.Add(index);
+            }
+
+            WriteFrame(output, frame, writer, w =>
+            {
+                w.Write((byte)'A');
+                w.Write(status);
+                WriteString(w, best == null ? "" : best.GetStem().GetSurface());
+                w.Write((ushort)count);
+                for (int i = 0; i < count; i++)
+                {
+                    var allomorph = allomorphs![i];
+                    w.Write(indices[i]);
+                    w.Write((byte)(allomorph.Surface != allomorph.Morpheme.LexicalForm ? 1 : 0));
+                    WriteString(w, allomorph.Surface);
+                }
+            });
+        }
+
+        static void WriteFrame(BinaryWriter output, MemoryStream frame, BinaryWriter writer, Action<BinaryWriter> body)
+        {
+            frame.SetLength(0);
+            body(writer);
+            writer.Flush();
+            output.Write((uint)frame.Length);
+            output.Write(frame.GetBuffer(), 0, (int)frame.Length);
+        }
+
+        static void WriteString(BinaryWriter w, string value)
+        {
+            byte[] bytes = Encoding.UTF8.GetBytes(value ?? "");
+            w.Write((ushort)bytes.Length);
+            w.Write(bytes);
+        }
+
         static AnalysisResult AnalyzeWord(Language tr, string word)
         {
+            if (word.Length == 0) return new AnalysisResult { Word = word };
+
             try
             {
                 IList<Word> solutions = tr.Analyze(word);
@@ -0,0 +1,59 @@
+import os
+import json
+import mmap
+
+import numpy as np
+
+
+def pack(magic, header, arrays):
+    """
+    Lays out magic, a JSON header and 8-byte aligned arrays; the header records
+    each array's absolute [offset, dtype, count] under "arrays".
+    """
+    header = dict(header, arrays={})
+    # The header size depends on the offsets it records; repeat until stable
+    while True:
+        header_bytes = json.dumps(header).encode("utf-8")
+        offset = len(magic) + 4 + len(header_bytes)
+        layout = {}
+        for name, array in arrays.items():
+            offset += -offset % 8
+            layout[name] = [offset, array.dtype.str, len(array)]
+            offset += array.nbytes
+        if layout == header["arrays"]:
+            break
+        header["arrays"] = layout
+
+    out = bytearray(magic + len(header_bytes).to_bytes(4, "little") + header_bytes)
+    for name, array in arrays.items():
+        out.extend(b"\0" * (-len(out) % 8))
+        out.extend(np.ascontiguousarray(array).tobytes())
+    return bytes(out)
+
+
+def read_header(buffer, magic):
+    if bytes(buffer[:len(magic)]) != magic:
+        raise ValueError(f"Not a {magic.decode('ascii', 'replace')} file")
+    start = len(magic) + 4
+    size = int.from_bytes(buffer[len(magic):start], "little")
+    return json.loads(bytes(buffer[start:start + size]).decode("utf-8"))
+
+
+def map_arrays(buffer, header):
+    """{name: read-only array view into buffer} for the arrays listed in the header."""
+    return {
+        name: np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        for name, (offset, dtype, count) in header["arrays"].items()
+    }
+
+
+def map_file(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
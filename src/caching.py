@@ -0,0 +1,391 @@
+import os
+import json
+import logging
+import sqlite3
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MORPH_STORE_PATH = "results/cache/morphology.sqlite"
+DEFAULT_EMBEDDING_STORE_PATH = "results/cache/embeddings"
+
+# Bump when the Python-side shape of stored analyses changes
+MORPH_SCHEMA_VERSION = 1
+
+
+class LRUCache:
+    """
+    Bounded in-memory mapping that evicts the least recently used entry.
+    Keeps hit/miss counters; safe to share between threads.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """Returns {key: value} for the keys present in the cache."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put_many(self, items):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class _SQLiteStore:
+    """
+    Shared SQLite plumbing of the persistent stores: a per-process connection
+    to db_path with the table in SCHEMA, and key lookups in bounded chunks.
+    """
+
+    SCHEMA = None
+    # Stay below SQLite's bound parameter limit
+    QUERY_CHUNK = 500
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # SQLite connections must not cross a fork; reopen in child processes
+        if self._conn is None or self._pid != os.getpid():
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+            self._pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(self.SCHEMA)
+        return self._conn
+
+    def _select_in(self, query, params, keys):
+        """
+        Rows of query, whose last condition is "IN ({})", for the given leading
+        params and every key, running one statement per chunk of keys.
+        """
+        conn = self._connection()
+        for i in range(0, len(keys), self.QUERY_CHUNK):
+            chunk = keys[i:i + self.QUERY_CHUNK]
+            yield from conn.execute(query.format(",".join("?" * len(chunk))), [*params, *chunk]).fetchall()
+
+    def _close_connection(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+class MorphologyStore(_SQLiteStore):
+    """
+    Persistent (engine, engine_version, token) -> analysis store backed by SQLite.
+    Analyses are stored as JSON. Writes are buffered and committed in batches,
+    so a second run over the same corpus needs no morphological analysis.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS morphology ("
+        "engine TEXT, version TEXT, token TEXT, analysis TEXT, "
+        "PRIMARY KEY (engine, version, token)) WITHOUT ROWID"
+    )
+
+    def __init__(self, path=DEFAULT_MORPH_STORE_PATH, flush_every=5000):
+        super().__init__(path)
+        self.path = path
+        self.flush_every = flush_every
+        self._pending = {}
+        self._lock = threading.RLock()
+        atexit.register(self.close)
+
+    def get_many(self, engine, version, tokens):
+        """Returns {token: analysis} for the tokens found in the store."""
+        found = {}
+        missing = []
+        with self._lock:
+            for t in set(tokens):
+                key = (engine, version, t)
+                if key in self._pending:
+                    found[t] = self._pending[key]
+                else:
+                    missing.append(t)
+
+            try:
+                rows = self._select_in(
+                    "SELECT token, analysis FROM morphology WHERE engine = ? AND version = ? AND token IN ({})",
+                    [engine, version], missing
+                )
+                for token, analysis in rows:
+                    found[token] = json.loads(analysis)
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Morphology store read failed: {e}")
+        return found
+
+    def get(self, engine, version, token):
+        return self.get_many(engine, version, [token]).get(token)
+
+    def put_many(self, engine, version, analyses):
+        """Buffers {token: analysis} for writing; commits once enough have accumulated."""
+        with self._lock:
+            for token, analysis in analyses.items():
+                self._pending[(engine, version, token)] = analysis
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            rows = [
+                (engine, version, token, json.dumps(analysis, ensure_ascii=False))
+                for (engine, version, token), analysis in self._pending.items()
+            ]
+            try:
+                conn = self._connection()
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO morphology VALUES (?, ?, ?, ?)", rows)
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Morphology store write failed: {e}")
+            self._pending.clear()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._close_connection()
+
+
+_default_store = None
+
+
+def get_morphology_store():
+    """
+    Returns the process-wide morphology store, or None when disabled.
+    NEREXT_MORPH_CACHE overrides the database path; "off" disables it.
+    """
+    global _default_store
+    path = os.environ.get("NEREXT_MORPH_CACHE", DEFAULT_MORPH_STORE_PATH)
+    if path.lower() in ("", "0", "off", "false", "none"):
+        return None
+    if _default_store is None or _default_store.path != path:
+        _default_store = MorphologyStore(path)
+    return _default_store
+
+
+def sentence_key(tokens):
+    """Stable key for a tokenized sentence (tokens may contain spaces)."""
+    return hashlib.sha1("\x1f".join(tokens).encode("utf-8")).digest()
+
+
+class EmbeddingStore(_SQLiteStore):
+    """
+    (model_name, sentence key) -> float16 array of token embeddings (tokens x dim).
+    The most recently used arrays are kept in memory within a byte budget. With a
+    path, arrays are also appended to a float16 data file, read back through a
+    memory map and indexed in SQLite, so later runs reuse them. The data file is
+    never compacted; delete the directory to reclaim its space.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        "model TEXT, key BLOB, offset INTEGER, rows INTEGER, dim INTEGER, "
+        "PRIMARY KEY (model, key)) WITHOUT ROWID"
+    )
+
+    def __init__(self, path=None, max_bytes=256 * 2 ** 20, flush_bytes=16 * 2 ** 20):
+        super().__init__(os.path.join(path, "index.sqlite") if path else None)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_bytes = flush_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._data = OrderedDict()
+        self._pending = {}
+        self._pending_bytes = 0
+        self._lock = threading.RLock()
+        self._map = None
+        if path:
+            atexit.register(self.close)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, "embeddings.f16")
+
+    def _remember(self, key, value):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        if value.nbytes > self.max_bytes:
+            return
+        self._data[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def _read(self, offset, rows, dim):
+        import numpy as np
+
+        end = offset + rows * dim
+        # The data file only grows; remap once it has outgrown the current map
+        if self._map is None or len(self._map) < end:
+            self._map = np.memmap(self.data_path, dtype=np.float16, mode="r")
+        return self._map[offset:end].reshape(rows, dim)
+
+    def get_many(self, model_name, keys):
+        """Returns {key: array} for the keys found in memory or on disk."""
+        found = {}
+        missing = []
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for key in unique:
+                entry = (model_name, key)
+                if entry in self._data:
+                    self._data.move_to_end(entry)
+                    found[key] = self._data[entry]
+                elif entry in self._pending:
+                    found[key] = self._pending[entry]
+                else:
+                    missing.append(key)
+
+            if missing and self.path and os.path.exists(self.data_path):
+                try:
+                    rows = self._select_in(
+                        "SELECT key, offset, rows, dim FROM embeddings WHERE model = ? AND key IN ({})",
+                        [model_name], missing
+                    )
+                    for key, offset, n_rows, dim in rows:
+                        found[key] = self._read(offset, n_rows, dim)
+                        self._remember((model_name, key), found[key])
+                        self.disk_hits += 1
+                except (sqlite3.Error, OSError, ValueError) as e:
+                    logging.warning(f"Embedding store read failed: {e}")
+
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def get(self, model_name, key):
+        return self.get_many(model_name, [key]).get(key)
+
+    def put_many(self, model_name, embeddings):
+        """Stores {key: array}; on-disk writes are buffered and appended in batches."""
+        # numpy stays off the import path of the preprocessing-only users of this module
+        import numpy as np
+
+        with self._lock:
+            for key, value in embeddings.items():
+                value = np.ascontiguousarray(value, dtype=np.float16)
+                self._remember((model_name, key), value)
+                if self.path:
+                    self._pending[(model_name, key)] = value
+                    self._pending_bytes += value.nbytes
+            if self._pending_bytes >= self.flush_bytes:
+                self.flush()
+
+    def put(self, model_name, key, value):
+        self.put_many(model_name, {key: value})
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            try:
+                conn = self._connection()
+                with conn:
+                    # Holding the write lock keeps appends from several processes apart
+                    conn.execute("BEGIN IMMEDIATE")
+                    rows = []
+                    with open(self.data_path, "ab") as f:
+                        offset = f.tell() // 2
+                        for (model_name, key), value in self._pending.items():
+                            f.write(value.tobytes())
+                            rows.append((model_name, key, offset, value.shape[0], value.shape[1]))
+                            offset += value.size
+                    conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Embedding store write failed: {e}")
+            self._pending.clear()
+            self._pending_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._close_connection()
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                "size": len(self._data), "nbytes": self.nbytes, "max_bytes": self.max_bytes}
+
+    def __len__(self):
+        return len(self._data)
+
+
+_default_embedding_store = None
+
+
+def get_embedding_store():
+    """
+    Returns the process-wide embedding store, in memory only unless
+    NEREXT_EMBEDDING_CACHE opts in to the on-disk copy: "on" for
+    DEFAULT_EMBEDDING_STORE_PATH, or a directory. NEREXT_EMBEDDING_CACHE_MB
+    sets the memory budget.
+    """
+    global _default_embedding_store
+    path = os.environ.get("NEREXT_EMBEDDING_CACHE", "")
+    if path.lower() in ("", "0", "off", "false", "none"):
+        path = None
+    elif path.lower() in ("1", "on", "true"):
+        path = DEFAULT_EMBEDDING_STORE_PATH
+    max_bytes = int(float(os.environ.get("NEREXT_EMBEDDING_CACHE_MB", 256)) * 2 ** 20)
+    store = _default_embedding_store
+    if store is None or store.path != path or store.max_bytes != max_bytes:
+        if store is not None:
+            store.close()
+        _default_embedding_store = EmbeddingStore(path, max_bytes=max_bytes)
+    return _default_embedding_store
@@ -0,0 +1,96 @@
+import os
+import hashlib
+
+import joblib
+import numpy as np
+
+
+class EmbeddingProjector:
+    """
+    Reduces token embeddings to a few CRF features with a linear projection
+    fitted on training embeddings: principal components ("pca") or a Gaussian
+    random projection ("random"). Outputs are centered and scaled to unit
+    variance on the training data. With n_buckets, each component becomes its
+    quantile bucket, a categorical feature, instead of a real value.
+    """
+
+    METHODS = ("pca", "random")
+
+    def __init__(self, method="pca", n_components=16, n_buckets=None, seed=0):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown embedding projection: {method}")
+        self.method = method
+        self.n_components = n_components
+        self.n_buckets = n_buckets
+        self.seed = seed
+        self.mean = None
+        self.components = None
+        self.bucket_edges = None
+
+    def fit(self, vectors):
+        """Fits the projection on a (tokens x dim) array of embeddings."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        k = min(self.n_components, vectors.shape[1])
+        self.mean = vectors.mean(axis=0)
+        centered = vectors - self.mean
+
+        if self.method == "pca":
+            # The dim x dim covariance is cheap to decompose, whatever the token count
+            covariance = centered.T.astype(np.float64) @ centered / max(len(centered) - 1, 1)
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+            components = eigenvectors[:, np.argsort(eigenvalues)[::-1][:k]]
+            # Eigenvector signs are arbitrary; fix them so refits give the same features
+            signs = np.sign(components[np.abs(components).argmax(axis=0), np.arange(k)])
+            components = components * signs
+        else:
+            components = np.random.default_rng(self.seed).standard_normal((vectors.shape[1], k))
+
+        projected = centered @ components.astype(np.float32)
+        scale = projected.std(axis=0)
+        scale[scale == 0] = 1.0
+        self.components = (components / scale).astype(np.float32)
+
+        if self.n_buckets:
+            quantiles = np.linspace(0, 1, self.n_buckets + 1)[1:-1]
+            self.bucket_edges = np.quantile(projected / scale, quantiles, axis=0).astype(np.float32)
+        return self
+
+    def transform(self, vectors):
+        """Projects a (tokens x dim) array to (tokens x n_components)."""
+        if self.components is None:
+            raise ValueError("EmbeddingProjector is not fitted")
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components
+
+    def features(self, vectors):
+        """CRF feature dicts ({"emb_<j>": value}), one per row of vectors."""
+        projected = self.transform(vectors)
+        names = [f'emb_{j}' for j in range(projected.shape[1])]
+        if self.bucket_edges is None:
+            return [dict(zip(names, row)) for row in projected.tolist()]
+        buckets = (projected[:, None, :] > self.bucket_edges[None, :, :]).sum(axis=1)
+        labels = [f'q{b}' for b in range(self.n_buckets)]
+        return [dict(zip(names, [labels[b] for b in row])) for row in buckets.tolist()]
+
+    def fingerprint(self):
+        """Identifies the fitted projection, e.g. for cache keys of features projected with it."""
+        if self.components is None:
+            raise ValueError("EmbeddingProjector is not fitted")
+        digest = hashlib.sha1(f"{self.method}{self.n_buckets}".encode("utf-8"))
+        for array in (self.mean, self.components, self.bucket_edges):
+            if array is not None:
+                digest.update(np.ascontiguousarray(array).tobytes())
+        return f"{self.method}{digest.hexdigest()[:12]}"
+
+    def save(self, filepath):
+        joblib.dump(self, filepath)
+
+    @staticmethod
+    def model_path(filepath):
+        """Where the projection used to train the model at filepath is stored."""
+        return f"{filepath}.projection.joblib"
+
+    @classmethod
+    def for_model(cls, filepath):
+        """The projection saved next to a model, or None if it was trained without one."""
+        path = cls.model_path(filepath)
+        return joblib.load(path) if os.path.exists(path) else None
@@ -1,9 +1,13 @@
 
 import os
+import sys
+import gc
 import json
 import logging
 import argparse
 import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from sklearn_crfsuite import metrics
 from sklearn.model_selection import KFold
@@ -11,6 +15,8 @@ import numpy as np
 from src.preprocessing import Preprocessor
 from src.features import FeatureExtractor
 from src.models.crf_model import CRFModel
+from src.feature_encoding import FeatureEncoder, EncodedCorpus
+from src.embedding_projection import EmbeddingProjector
 import joblib
 
 # Configure logging
@@ -64,7 +70,59 @@ def get_external_data(source_names):
 
     return data
 
-def run_experiment(train_config, feature_config, output_dir="results/experiments", engine="zemberek", cv=False, k=5):
+def take_sentences(X, indices):
+    if isinstance(X, EncodedCorpus):
+        return X.take(indices)
+    return [X[j] for j in indices]
+
+# Training features for cross-validation folds. Forked fold workers inherit
+# them copy-on-write instead of receiving a pickled copy per fold.
+_cv_data = None
+
+def _run_fold(train_idx, val_idx, model_path, weight_path):
+    X_train, y_train = _cv_data
+    X_f_train = take_sentences(X_train, train_idx)
+    y_f_train = [y_train[j] for j in train_idx]
+    X_f_val = take_sentences(X_train, val_idx)
+    y_f_val = [y_train[j] for j in val_idx]
+
+    crf_f = CRFModel(c1=0.1, c2=0.1)
+    crf_f.train(X_f_train, y_f_train)
+    f1_f, report_f = crf_f.evaluate(X_f_val, y_f_val)
+
+    # Save fold model
+    crf_f.save(model_path)
+    crf_f.save_weights(weight_path)
+    return f1_f, report_f
+
+def run_folds(X_train, y_train, folds, workers=None):
+    """
+    Trains and evaluates one CRF per (train_idx, val_idx, model_path, weight_path)
+    fold, on up to `workers` forked processes. Returns (f1, report) per fold, in order.
+    Folds run one after another outside Linux: forking after torch, Accelerate or
+    Objective-C have been loaded is unsafe on macOS, and spawn would copy the features.
+    """
+    global _cv_data
+    workers = min(len(folds), workers or os.cpu_count() or 1)
+    _cv_data = (X_train, y_train)
+    try:
+        if workers == 1 or not sys.platform.startswith("linux"):
+            return [_run_fold(*fold) for fold in folds]
+
+        # Frozen objects are skipped by the children's garbage collector, so it
+        # does not write to (and copy) the shared pages
+        gc.freeze()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+                futures = [executor.submit(_run_fold, *fold) for fold in folds]
+                return [future.result() for future in futures]
+        finally:
+            gc.unfreeze()
+    finally:
+        _cv_data = None
+
+def run_experiment(train_config, feature_config, output_dir="results/experiments", engine="zemberek", cv=False, k=5,
+                   encoding=None, cv_workers=None):
     """
     Runs experiment with flexible training configuration.
     train_config: {
@@ -72,11 +130,24 @@ def run_experiment(train_config, feature_config, output_dir="results/experiments
         "external_sources": list of strings
     }
     engine: "zemberek" or "nuve"
+    encoding: None (feature dicts), "vocab" or "hash" to hold features as integer-encoded arrays
+    cv_workers: processes to train CV folds on (default: one per CPU, at most k)
     """
     ext_str = "_".join(train_config.get("external_sources", []))
     gold_str = "Gold" if train_config.get("include_gold_train") else "NoGold"
 
     exp_id = f"train_{gold_str}_{ext_str}_feat_{'_'.join([k for k,v in feature_config.items() if v])}"
+    # Embedding projection settings are values, not just flags; keep their runs apart
+    projection = feature_config.get("embedding_projection") if feature_config.get("use_embeddings") else None
+    proj_str = ""
+    if projection:
+        proj_str = f"_proj-{projection}{feature_config.get('embedding_dims', 16)}"
+        if feature_config.get("embedding_buckets"):
+            proj_str += f"q{feature_config['embedding_buckets']}"
+        exp_id += proj_str
+    if encoding:
+        # Encoded runs save an encoder next to the model; keep them apart from plain runs
+        exp_id += f"_enc-{encoding}"
     logging.info(f"Starting Experiment: {exp_id}")
 
     # 1. Prepare Data
@@ -116,7 +187,7 @@ def run_experiment(train_config, feature_config, output_dir="results/experiments
 
     prep = Preprocessor(engine=engine)
 
-    def prepare_features(dataset, cache_key=None):
+    def prepare_features(dataset, cache_key=None, encoder=None):
         if cache_key:
             cache_dir = "results/cache"
             os.makedirs(cache_dir, exist_ok=True)
@@ -125,61 +196,70 @@ def run_experiment(train_config, feature_config, output_dir="results/experiments
                 logging.info(f"Loading cached features: {cache_path}")
                 return joblib.load(cache_path)
 
-        X, y = [], []
-        for item in dataset:
-            tokens = item['tokens']
-            tags = item['tags']
-            processed_tokens = prep.process_sentence(tokens)
-            feats = extractor.sent2features(processed_tokens)
-            X.append(feats)
-            y.append(tags)
+        processed_corpus = prep.process_corpus(item['tokens'] for item in dataset)
+        # Embeddings (if enabled) are computed in batches across sentences
+        feats = extractor.corpus2features(processed_corpus)
+        # Encoded sentences are added one at a time, so feature dicts are never all held at once
+        X = encoder.encode(feats) if encoder is not None else list(feats)
+        y = [item['tags'] for item in dataset]
 
         if cache_key:
             logging.info(f"Caching features to: {cache_path}")
-            joblib.dump((X, y), cache_path)
+            # Encoded arrays compress well and cheaply
+            joblib.dump((X, y), cache_path, compress=3 if encoder is not None else 0)
 
         return X, y
 
     logging.info("Extracting features...")
-    # Unique cache key based on configuration and engine
-    train_cache_key = f"train_{gold_str}_{ext_str}_{engine}_feat_{'_'.join([k for k,v in feature_config.items() if v])}"
-    test_cache_key = f"test_gold_{engine}_feat_{'_'.join([k for k,v in feature_config.items() if v])}"
-
-    X_train, y_train = prepare_features(train_data, cache_key=train_cache_key)
+    # Unique cache key based on configuration, engine and the feature definitions
+    feat_str = f"{'_'.join([k for k,v in feature_config.items() if v])}{proj_str}_v{FeatureExtractor.FEATURES_VERSION}"
+    train_cache_key = f"train_{gold_str}_{ext_str}_{engine}_feat_{feat_str}"
+    test_cache_key = f"test_gold_{engine}_feat_{feat_str}"
+
+    if projection:
+        # Fitted on the training sentences once and reused along with their cached features
+        projection_path = os.path.join("results/cache", f"{train_cache_key}.projection.joblib")
+        if os.path.exists(projection_path):
+            extractor.embedding_projection = joblib.load(projection_path)
+        else:
+            logging.info(f"Fitting {projection} embedding projection...")
+            extractor.fit_embedding_projection(
+                [item['tokens'] for item in train_data], method=projection,
+                n_components=feature_config.get("embedding_dims", 16),
+                n_buckets=feature_config.get("embedding_buckets")
+            )
+            os.makedirs("results/cache", exist_ok=True)
+            extractor.embedding_projection.save(projection_path)
+        # Test features depend on the training data the projection was fitted on
+        test_cache_key += f"_fit-{extractor.embedding_projection.fingerprint()}"
+
+    encoder = None
+    if encoding:
+        train_cache_key += f"_enc-{encoding}"
+        encoder = FeatureEncoder(mode=encoding)
+
+    X_train, y_train = prepare_features(train_data, cache_key=train_cache_key, encoder=encoder)
+    if encoding:
+        # Test features only use attributes known from training
+        encoder = X_train.encoder.freeze()
+        test_cache_key += f"_enc-{encoder.fingerprint()}"
 
     cv_results = {}
     if cv:
         logging.info(f"Running {k}-fold Cross-Validation...")
         kf = KFold(n_splits=k, shuffle=True, random_state=42)
-        fold_scores = []
-        fold_reports = []
-        fold_model_paths = []
-        fold_weight_paths = []
-
         fold_dir = os.path.join(output_dir.replace("experiments", "models"), "folds")
         os.makedirs(fold_dir, exist_ok=True)
 
-        for i, (train_idx, val_idx) in enumerate(kf.split(X_train), 1):
-            X_f_train = [X_train[j] for j in train_idx]
-            y_f_train = [y_train[j] for j in train_idx]
-            X_f_val = [X_train[j] for j in val_idx]
-            y_f_val = [y_train[j] for j in val_idx]
-
-            crf_f = CRFModel(c1=0.1, c2=0.1)
-            crf_f.train(X_f_train, y_f_train)
-            f1_f, report_f = crf_f.evaluate(X_f_val, y_f_val)
-            fold_scores.append(f1_f)
-            fold_reports.append(report_f)
-
-            # Save fold model
-            f_model_path = os.path.join(fold_dir, f"{exp_id}_fold_{i}.joblib")
-            f_weight_path = os.path.join(fold_dir, f"{exp_id}_fold_{i}_weights.json")
-            crf_f.save(f_model_path)
-            crf_f.save_weights(f_weight_path)
-
-            fold_model_paths.append(f_model_path)
-            fold_weight_paths.append(f_weight_path)
+        fold_model_paths = [os.path.join(fold_dir, f"{exp_id}_fold_{i}.joblib") for i in range(1, k + 1)]
+        fold_weight_paths = [os.path.join(fold_dir, f"{exp_id}_fold_{i}_weights.json") for i in range(1, k + 1)]
+        folds = [(train_idx, val_idx, f_model_path, f_weight_path) for (train_idx, val_idx), f_model_path, f_weight_path
+                 in zip(kf.split(np.arange(len(y_train))), fold_model_paths, fold_weight_paths)]
 
+        fold_results = run_folds(X_train, y_train, folds, workers=cv_workers)
+        fold_scores = [f1_f for f1_f, _ in fold_results]
+        fold_reports = [report_f for _, report_f in fold_results]
+        for i, f1_f in enumerate(fold_scores, 1):
             logging.info(f"Fold {i}: F1 = {f1_f:.4f}")
 
         cv_results = {
@@ -192,7 +272,7 @@ def run_experiment(train_config, feature_config, output_dir="results/experiments
         }
         logging.info(f"CV Average F1: {cv_results['average_f1']:.4f}")
 
-    X_test, y_test = prepare_features(test_data, cache_key=test_cache_key)
+    X_test, y_test = prepare_features(test_data, cache_key=test_cache_key, encoder=encoder)
 
     # 3. Train (Full)
     logging.info(f"Training final CRF model on {len(X_train)} samples...")
@@ -211,6 +291,8 @@ def run_experiment(train_config, feature_config, output_dir="results/experiments
 
     crf.save(model_path)
     crf.save_weights(weight_path)
+    if extractor.embedding_projection is not None:
+        extractor.embedding_projection.save(EmbeddingProjector.model_path(model_path))
 
     # 6. Save Results
     result = {
@@ -223,7 +305,8 @@ def run_experiment(train_config, feature_config, output_dir="results/experiments
             "feature_config": feature_config,
             "cv": cv,
             "k": k,
-            "engine": engine
+            "engine": engine,
+            "encoding": encoding
         },
         "stats": {
             "train": train_stats,
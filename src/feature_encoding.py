@@ -0,0 +1,186 @@
+import zlib
+import hashlib
+from array import array
+
+import numpy as np
+
+
+def crfsuite_attributes(features):
+    """(attribute, weight) pairs of a feature dict, as python-crfsuite reads them."""
+    for name, value in features.items():
+        if isinstance(value, str):
+            yield f"{name}:{value}", 1.0
+        else:
+            yield name, float(value)
+
+
+class FeatureEncoder:
+    """
+    Maps CRF feature dicts to integer attribute ids, through a vocabulary that
+    is frozen once a model is trained ("vocab") or through feature hashing ("hash").
+    Attributes follow python-crfsuite: a string value becomes "name:value" with
+    weight 1, a numeric or boolean value keeps the name and becomes the weight.
+    """
+
+    def __init__(self, mode="vocab", n_features=2 ** 20):
+        if mode not in ("vocab", "hash"):
+            raise ValueError(f"Unknown feature encoding: {mode}")
+        self.mode = mode
+        self.n_features = n_features
+        self.vocab = {}
+        self.frozen = False
+        self._names = None
+
+    def freeze(self):
+        """Stops adding attributes; unknown ones are dropped from then on."""
+        self.frozen = True
+        return self
+
+    def _attribute_id(self, attribute):
+        if self.mode == "hash":
+            # Colliding attributes share a weight
+            return zlib.crc32(attribute.encode("utf-8")) % self.n_features
+        attr_id = self.vocab.get(attribute)
+        if attr_id is None and not self.frozen:
+            attr_id = self.vocab[attribute] = len(self.vocab)
+            self._names = None
+        return attr_id
+
+    def encode_token(self, features):
+        """Returns (attribute ids, weights) for one token's feature dict."""
+        ids, weights = [], []
+        for attribute, weight in crfsuite_attributes(features):
+            attr_id = self._attribute_id(attribute)
+            if attr_id is not None:
+                ids.append(attr_id)
+                weights.append(weight)
+        return ids, weights
+
+    def encode(self, X):
+        """Encodes an iterable of sentences (lists of feature dicts) into an EncodedCorpus."""
+        return EncodedCorpus.from_features(self, X)
+
+    def attribute_name(self, attr_id):
+        """Original attribute for an id (as used by the CRF model); hashed ids are returned as is."""
+        if self.mode == "hash":
+            return str(attr_id)
+        if self._names is None:
+            self._names = list(self.vocab)
+        return self._names[int(attr_id)]
+
+    def fingerprint(self):
+        """Identifies the id assignment, e.g. for cache keys of data encoded with this encoder."""
+        if self.mode == "hash":
+            return f"hash{self.n_features}"
+        digest = hashlib.sha1()
+        for attribute in self.vocab:
+            digest.update(attribute.encode("utf-8") + b"\0")
+        return f"vocab{digest.hexdigest()[:12]}"
+
+
+def _ranges(starts, ends):
+    """Concatenation of arange(start, end) for each pair, without a Python loop."""
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum(), dtype=np.int64) - np.repeat(offsets, lengths) + np.repeat(starts, lengths)
+
+
+class EncodedCorpus:
+    """
+    Array-backed feature corpus: attribute ids and weights for all tokens plus
+    token and sentence offsets. Indexing or iterating yields python-crfsuite
+    sentences ({"<attribute id>": weight} per token), so it can be passed
+    straight to CRF fit/predict.
+    """
+
+    def __init__(self, encoder, ids, weights, token_offsets, sentence_offsets, weight_table=None):
+        self.encoder = encoder
+        self.ids = ids
+        # With a weight table, weights holds uint8 codes into it
+        self.weights = weights
+        self.weight_table = weight_table
+        self.token_offsets = token_offsets
+        self.sentence_offsets = sentence_offsets
+
+    @classmethod
+    def from_features(cls, encoder, X):
+        ids = array("i")
+        token_offsets, sentence_offsets = array("q", [0]), array("q", [0])
+        # Boolean and count features only take a handful of distinct weights,
+        # stored as uint8 codes; fall back to float32 weights beyond 256 values
+        table, codes, weights = {}, array("B"), None
+        for sent in X:
+            for features in sent:
+                token_ids, token_weights = encoder.encode_token(features)
+                ids.extend(token_ids)
+                if weights is None:
+                    token_codes = [table.setdefault(w, len(table)) for w in token_weights]
+                    if len(table) > 256:
+                        values = np.array(list(table), dtype=np.float32)
+                        weights = array("f", values[np.frombuffer(codes, dtype=np.uint8)].tolist())
+                        weights.extend(token_weights)
+                    else:
+                        codes.extend(token_codes)
+                else:
+                    weights.extend(token_weights)
+                token_offsets.append(len(ids))
+            sentence_offsets.append(len(token_offsets) - 1)
+
+        if weights is None:
+            weight_table = np.array(list(table), dtype=np.float32)
+            weights = np.frombuffer(codes, dtype=np.uint8)
+        else:
+            weight_table = None
+            weights = np.frombuffer(weights, dtype=np.float32)
+        return cls(encoder, np.frombuffer(ids, dtype=np.int32), weights,
+                   np.frombuffer(token_offsets, dtype=np.int64), np.frombuffer(sentence_offsets, dtype=np.int64),
+                   weight_table)
+
+    def __len__(self):
+        return len(self.sentence_offsets) - 1
+
+    def sentence(self, k):
+        first, last = self.sentence_offsets[k], self.sentence_offsets[k + 1]
+        bounds = self.token_offsets[first:last + 1].tolist()
+        ids = self.ids[bounds[0]:bounds[-1]].tolist()
+        weights = self.weights[bounds[0]:bounds[-1]]
+        if self.weight_table is not None:
+            weights = self.weight_table[weights]
+        weights = weights.tolist()
+        start = bounds[0]
+        return [
+            dict(zip(map(str, ids[a - start:b - start]), weights[a - start:b - start]))
+            for a, b in zip(bounds, bounds[1:])
+        ]
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return self.take(range(*k.indices(len(self))))
+        return self.sentence(k)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self.sentence(k)
+
+    def take(self, indices):
+        """Returns a new corpus with the given sentences, e.g. for a CV fold."""
+        indices = np.asarray(indices, dtype=np.int64)
+        first = self.sentence_offsets[indices]
+        last = self.sentence_offsets[indices + 1]
+        token_index = _ranges(first, last)
+        starts, ends = self.token_offsets[token_index], self.token_offsets[token_index + 1]
+        value_index = _ranges(starts, ends)
+
+        token_offsets = np.zeros(len(token_index) + 1, dtype=np.int64)
+        np.cumsum(ends - starts, out=token_offsets[1:])
+        sentence_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(last - first, out=sentence_offsets[1:])
+        return EncodedCorpus(self.encoder, self.ids[value_index], self.weights[value_index],
+                             token_offsets, sentence_offsets, self.weight_table)
+
+    @property
+    def nbytes(self):
+        arrays = [self.ids, self.weights, self.token_offsets, self.sentence_offsets]
+        if self.weight_table is not None:
+            arrays.append(self.weight_table)
+        return sum(a.nbytes for a in arrays)
@@ -1,140 +1,381 @@
 import os
-import re
+import inspect
+import logging
+import random
+import warnings
 import numpy as np
+from src.gazetteer_matcher import GazetteerIndex, read_gazetteers
+from src.keyword_matcher import KeywordMatcher
+from src.caching import LRUCache, get_embedding_store, sentence_key
+
+# NEREXT_BERT_QUANTIZE / quantize= values
+QUANTIZE_MODES = {"int8": "int8", "fp32": None, "off": None, "none": None, "0": None, "false": None, "": None}
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of the model's linear layers, or None if this torch
+    has no eager-mode quantization. torch.ao.quantization is deprecated in favour of
+    the separate torchao package; checked to work up to torch 2.14.
+    """
+    import torch
+    try:
+        from torch.ao.quantization import quantize_dynamic
+    except ImportError:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.filterwarnings("ignore", message=".*quantiz.*deprecated", category=UserWarning)
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
 
 class BERTFeatureExtractor:
     _instance = None
 
-    def __new__(cls, model_name="dbmdz/bert-base-turkish-cased"):
+    def __new__(cls, model_name="dbmdz/bert-base-turkish-cased", quantize=None, threads=None):
         if cls._instance is None:
             cls._instance = super(BERTFeatureExtractor, cls).__new__(cls)
             cls._instance.initialized = False
         return cls._instance
 
-    def __init__(self, model_name="dbmdz/bert-base-turkish-cased"):
+    def __init__(self, model_name="dbmdz/bert-base-turkish-cased", quantize=None, threads=None):
+        """
+        quantize: "int8" runs the linear layers with dynamic int8 quantization (CPU only),
+            "fp32" (or None with the variable unset) does not
+        threads: torch intra-op thread count
+        Both default to the NEREXT_BERT_QUANTIZE and NEREXT_BERT_THREADS environment variables.
+        """
         if self.initialized:
             return
 
         import torch
         from transformers import AutoTokenizer, AutoModel
 
-        self.device = "mps" if torch.backends.mps.is_available() else "cpu"
+        if quantize is None:
+            value = os.environ.get("NEREXT_BERT_QUANTIZE", "").strip().lower()
+            if value not in QUANTIZE_MODES:
+                logging.warning(f"Ignoring NEREXT_BERT_QUANTIZE={value!r}, expected one of {sorted(QUANTIZE_MODES)}")
+            quantize = QUANTIZE_MODES.get(value)
+        elif quantize in QUANTIZE_MODES:
+            quantize = QUANTIZE_MODES[quantize]
+        else:
+            raise ValueError(f"Unknown BERT quantization: {quantize}")
+        if threads is None and os.environ.get("NEREXT_BERT_THREADS"):
+            try:
+                threads = int(os.environ["NEREXT_BERT_THREADS"])
+            except ValueError:
+                logging.warning(f"Ignoring NEREXT_BERT_THREADS={os.environ['NEREXT_BERT_THREADS']!r}, expected an integer")
+        if threads:
+            torch.set_num_threads(threads)
+
+        self.device = "mps" if torch.backends.mps.is_available() and not quantize else "cpu"
         self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+        if self.tokenizer.pad_token is None:
+            # GPT-style tokenizers have no padding token; batches need one
+            self.tokenizer.pad_token = self.tokenizer.eos_token
         # Use AutoModel to handle BERT, BART (VBART), and GPT (Kumru) architectures
-        self.model = AutoModel.from_pretrained(model_name, trust_remote_code=True).to(self.device).eval()
-        self.cache = {}
+        self.model = AutoModel.from_pretrained(model_name, trust_remote_code=True).eval()
+        if quantize:
+            quantized = quantize_int8(self.model)
+            if quantized is None:
+                logging.warning(f"torch {torch.__version__} has no dynamic quantization, running the model in fp32")
+                quantize = None
+            else:
+                self.model = quantized
+        self.model = self.model.to(self.device)
+        # Tokenizer outputs the model accepts (e.g. no token_type_ids for GPT-style models)
+        self.forward_args = set(inspect.signature(self.model.forward).parameters)
+        self.model_name = model_name
+        self.quantize = quantize
+        # Quantized embeddings differ slightly from fp32 ones; keep them apart in the store
+        self.store_name = f"{model_name}@{quantize}" if quantize else model_name
+        # Bounded, float16, optionally persisted across runs
+        self.cache = get_embedding_store()
         self.initialized = True
 
     def get_sentence_embeddings(self, tokens):
         """
         Extracts contextual embeddings for a sentence.
-        Returns a list of vectors (1 per token).
+        Returns a float16 array with one row per token.
         """
-        sent_str = " ".join(tokens)
-        if sent_str in self.cache:
-            return self.cache[sent_str]
+        return self.get_batch_embeddings([tokens])[0]
 
+    def get_batch_embeddings(self, sentences, batch_size=32):
+        """
+        Extracts contextual embeddings for several sentences, running the model
+        on padded mini-batches. Returns one array (1 row per token) per sentence.
+        """
+        keys = [sentence_key(tokens) for tokens in sentences]
+        found = self.cache.get_many(self.store_name, keys)
+        todo = {}
+        for key, tokens in zip(keys, sentences):
+            if key not in found and key not in todo:
+                todo[key] = tokens
+
+        # Similar lengths in a batch keep padding low
+        pending = sorted(todo.items(), key=lambda item: len(item[1]))
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            computed = dict(zip([key for key, _ in batch], self._embed_batch([tokens for _, tokens in batch])))
+            self.cache.put_many(self.store_name, computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def _embed_batch(self, batch):
         import torch
-        inputs = self.tokenizer(tokens, is_split_into_words=True, return_tensors="pt", padding=True, truncation=True).to(self.device)
 
-        # Filter inputs to only include what the model accepts
-        import inspect
-        sig = inspect.signature(self.model.forward)
-        model_inputs = {k: v for k, v in inputs.items() if k in sig.parameters}
+        lengths = [len(tokens) for tokens in batch]
+        results = [np.zeros((0, 0), dtype=np.float16) for _ in batch]
+        nonempty = [b for b, n in enumerate(lengths) if n > 0]
+        if not nonempty:
+            return results
+
+        texts = [batch[b] for b in nonempty]
+        inputs = self.tokenizer(texts, is_split_into_words=True, return_tensors="pt", padding=True, truncation=True)
+        model_inputs = {k: v.to(self.device) for k, v in inputs.items() if k in self.forward_args}
 
         with torch.no_grad():
-            outputs = self.model(**model_inputs)
             # Use last hidden state
-            last_hidden_state = outputs.last_hidden_state[0] # (seq_len, 768)
-
-            # Map word tokens back to original tokens (handling subwords)
-            word_ids = inputs.word_ids()
-            word_embeddings = []
-
-            current_word_idx = -1
-            current_word_vecs = []
-
-            for i, word_idx in enumerate(word_ids):
-                if word_idx is None: continue # Skip [CLS], [SEP], [PAD]
-
-                if word_idx != current_word_idx:
-                    if current_word_vecs:
-                        word_embeddings.append(torch.stack(current_word_vecs).mean(dim=0).cpu().numpy())
-                    current_word_idx = word_idx
-                    current_word_vecs = [last_hidden_state[i]]
-                else:
-                    current_word_vecs.append(last_hidden_state[i])
-
-            if current_word_vecs:
-                word_embeddings.append(torch.stack(current_word_vecs).mean(dim=0).cpu().numpy())
-
-        # Ensure we have the same number of vectors as tokens
-        if len(word_embeddings) != len(tokens):
-            # This can happen due to truncation or tokenizer edge cases
-            if len(word_embeddings) < len(tokens):
-                word_embeddings.extend([np.zeros(768)] * (len(tokens) - len(word_embeddings)))
-            else:
-                word_embeddings = word_embeddings[:len(tokens)]
-
-        self.cache[sent_str] = word_embeddings
-        return word_embeddings
+            hidden = self.model(**model_inputs).last_hidden_state.float().cpu()  # (batch, seq_len, hidden)
+
+        # Scatter-mean subword vectors into their word's slot ([CLS], [SEP], [PAD] have no word)
+        n_rows, _, dim = hidden.shape
+        max_words = max(lengths)
+        word_ids = torch.tensor([[-1 if w is None else w for w in inputs.word_ids(row)] for row in range(n_rows)])
+        mask = word_ids >= 0
+        slots = (torch.arange(n_rows).unsqueeze(1) * max_words + word_ids)[mask]
+        sums = torch.zeros(n_rows * max_words, dim).index_add_(0, slots, hidden[mask])
+        counts = torch.zeros(n_rows * max_words).index_add_(0, slots, torch.ones(len(slots)))
+        # Words lost to truncation keep a zero vector
+        means = (sums / counts.clamp(min=1).unsqueeze(1)).view(n_rows, max_words, dim).numpy()
+
+        for row, b in enumerate(nonempty):
+            results[b] = means[row, :lengths[b]].astype(np.float16)
+        return results
 
 class FeatureExtractor:
+    GAZETTEER_FEATURES = ['kisiler', 'yerler', 'sirketler', 'kurumlar', 'film_muzik', 'topluluklar']
+    # Bump when the features produced for the same input change
+    # (2: long gazetteer spans, stable Zemberek analysis choice)
+    FEATURES_VERSION = 2
+
     def __init__(self, gazetteer_dir="gazetteers", use_gazetteers=True, use_morphology=True,
-                 use_embeddings=False, embedding_model="dbmdz/bert-base-turkish-cased"):
+                 use_embeddings=False, embedding_model="dbmdz/bert-base-turkish-cased", keyword_table=None,
+                 feature_cache_size=0, embedding_projection=None):
+        """
+        keyword_table: keyword/suffix cue entries, see src.keyword_matcher.DEFAULT_KEYWORD_TABLE
+        feature_cache_size: token feature dicts memoized by local context. Off (0) by default:
+            on one pass over a corpus few contexts repeat, and the memo outweighs encoded
+            training data (see `run_perf_benchmarks features`); worth it for repeated passes
+        embedding_projection: fitted src.embedding_projection.EmbeddingProjector; without one
+            the first 16 embedding dimensions are used
+        """
         self.use_gazetteers = use_gazetteers
         self.use_morphology = use_morphology
         self.use_embeddings = use_embeddings
         self.gazetteers = {}
-        self.embedding_extractor = None
-        if self.use_embeddings:
-            self.embedding_extractor = BERTFeatureExtractor(model_name=embedding_model)
+        self.embedding_model = embedding_model
+        self.embedding_projection = embedding_projection
+        self._embedding_extractor = None
+        self.keywords = KeywordMatcher(keyword_table)
+        self.feature_cache = LRUCache(feature_cache_size)
+        self._morph_signatures = {}
 
         # Only load if enabled
         if self.use_gazetteers:
             self.load_gazetteers(gazetteer_dir)
         else:
-            self.full_names = {}
-            self.tokens_set = {}
+            self.gazetteer_dir = None
+            self.index = None
+            self._full_names = {}
+            self._tokens_set = {}
 
-    def load_gazetteers(self, gazetteer_dir):
+    @classmethod
+    def from_config(cls, feature_config, model_path=None):
+        """
+        Extractor for an experiment feature_config (see run_experiment), with the
+        embedding projection saved next to the model at model_path, if any.
         """
-        Loads gazetteer files into sets for fast lookup.
-        Stores both full entries and individual tokens.
+        from src.embedding_projection import EmbeddingProjector
+
+        projection = EmbeddingProjector.for_model(model_path) if model_path else None
+        if feature_config.get("use_embeddings") and feature_config.get("embedding_projection") and projection is None:
+            raise ValueError(f"No embedding projection found for {model_path}")
+        return cls(
+            use_gazetteers=feature_config.get("use_gazetteers", True),
+            use_morphology=feature_config.get("use_morphology", True),
+            use_embeddings=feature_config.get("use_embeddings", False),
+            embedding_model=feature_config.get("embedding_model", "dbmdz/bert-base-turkish-cased"),
+            embedding_projection=projection if feature_config.get("use_embeddings") else None,
+        )
+
+    @property
+    def embedding_extractor(self):
+        # torch/transformers are only loaded once embeddings are actually needed
+        if self._embedding_extractor is None and self.use_embeddings:
+            self._embedding_extractor = BERTFeatureExtractor(model_name=self.embedding_model)
+        return self._embedding_extractor
+
+    def fit_embedding_projection(self, sentences, method="pca", n_components=16, n_buckets=None,
+                                 sample_size=5000, batch_size=32, seed=0):
         """
-        self.full_names = {}
-        self.tokens_set = {} # For partial membership signal
+        Fits an embedding projection on the token embeddings of (a sample of)
+        the given token lists and uses it from then on.
+        """
+        from src.embedding_projection import EmbeddingProjector
 
-        if not os.path.exists(gazetteer_dir):
-            return
+        sentences = [tokens for tokens in sentences if tokens]
+        if len(sentences) > sample_size:
+            sentences = random.Random(seed).sample(sentences, sample_size)
+        embeddings = self.embedding_extractor.get_batch_embeddings(sentences, batch_size=batch_size)
+        projector = EmbeddingProjector(method, n_components, n_buckets, seed)
+        self.embedding_projection = projector.fit(np.concatenate(embeddings))
+        return self.embedding_projection
+
+    def embedding_features(self, embeddings):
+        """
+        Per-token embedding feature dicts for a list of sentence embedding arrays.
+        The projection runs once over the tokens of all sentences.
+        """
+        lengths = [len(e) for e in embeddings]
+        if not sum(lengths):
+            return [[] for _ in embeddings]
+        vectors = np.concatenate([np.asarray(e, dtype=np.float32) for e in embeddings if len(e)])
+        if self.embedding_projection is not None:
+            rows = self.embedding_projection.features(vectors)
+        else:
+            # Unfitted default: the first 16 dimensions as they are
+            names = [f'emb_{j}' for j in range(min(16, vectors.shape[1]))]
+            rows = [dict(zip(names, row)) for row in vectors[:, :16].tolist()]
+        bounds = np.cumsum([0] + lengths).tolist()
+        return [rows[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    def get_config(self):
+        """
+        The settings that determine which features are produced (JSON-serializable),
+        e.g. to store with a model trained on them.
+        """
+        projection = self.embedding_projection
+        return {
+            "features_version": self.FEATURES_VERSION,
+            "use_gazetteers": self.use_gazetteers,
+            "use_morphology": self.use_morphology,
+            "use_embeddings": self.use_embeddings,
+            "embedding_model": self.embedding_model if self.use_embeddings else None,
+            "embedding_projection": {
+                "method": projection.method,
+                "n_components": projection.n_components,
+                "n_buckets": projection.n_buckets,
+            } if self.use_embeddings and projection is not None else None,
+            # File names and sizes; mtimes differ between checkouts
+            "gazetteers": [entry[:2] for entry in self.index.header["signature"]] if self.index is not None else None,
+            "keyword_table": self.keywords.table,
+        }
 
-        for filename in os.listdir(gazetteer_dir):
-            if filename.endswith(".txt"):
-                name = filename.replace(".txt", "")
-                path = os.path.join(gazetteer_dir, filename)
-                self.full_names[name] = set()
-                self.tokens_set[name] = set()
-
-                with open(path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        entry = line.strip().lower()
-                        if entry:
-                            self.full_names[name].add(entry)
-                            # Also add individual tokens
-                            for t in entry.split():
-                                self.tokens_set[name].add(t)
+    def load_gazetteers(self, gazetteer_dir):
+        """
+        Memory-maps the compiled gazetteer index, compiling it first if the
+        text files changed. The raw sets are only read when accessed.
+        """
+        self.gazetteer_dir = gazetteer_dir
+        self.index = GazetteerIndex.load(gazetteer_dir)
+        self._full_names = None
+        self._tokens_set = None
+
+        # (feature name, category bit) for the single word membership features
+        categories = self.index.categories if self.index is not None else []
+        self._token_gazetteer_bits = [
+            (f'in_{g_name}_tokens', 1 << categories.index(g_name) if g_name in categories else 0)
+            for g_name in self.GAZETTEER_FEATURES
+        ]
+
+    def _read_gazetteer_sets(self):
+        self._full_names, self._tokens_set = read_gazetteers(self.gazetteer_dir)
+
+    @property
+    def full_names(self):
+        if self._full_names is None:
+            self._read_gazetteer_sets()
+        return self._full_names
+
+    @property
+    def tokens_set(self):
+        # For partial membership signal
+        if self._tokens_set is None:
+            self._read_gazetteer_sets()
+        return self._tokens_set
+
+    @property
+    def matcher(self):
+        return self.index
 
     def check_gazetteer(self, text, gazetteer_name, is_token=False):
-        if not self.use_gazetteers:
+        if not self.use_gazetteers or self.index is None:
             return False
         text = text.lower()
         if is_token:
-            return text in self.tokens_set.get(gazetteer_name, set())
-        return text in self.full_names.get(gazetteer_name, set())
+            return self.index.has_token(text, gazetteer_name)
+        return self.index.contains(text, gazetteer_name)
+
+    def gazetteer_span_features(self, sent):
+        """
+        Scans the sentence once for multi-word gazetteer entries.
+        Returns one set of span feature names per token.
+        """
+        span_features = [set() for _ in sent]
+        if not self.use_gazetteers or self.matcher is None:
+            return span_features
+
+        for start, end, g_name in self.matcher.find_spans([w['word'] for w in sent]):
+            if g_name not in self.GAZETTEER_FEATURES:
+                continue
+            length = end - start
+            if length == 2:
+                span_features[start].add(f'start_bigram_{g_name}')
+                span_features[start + 1].add(f'inside_bigram_{g_name}')
+            elif length == 3:
+                span_features[start].add(f'start_trigram_{g_name}')
+            elif length > 3:
+                span_features[start].add(f'start_long_{g_name}')
+                for j in range(start + 1, end):
+                    span_features[j].add(f'inside_long_{g_name}')
+        return span_features
+
+    def sentence_attributes(self, sent):
+        """
+        Per-token attributes shared by a token's own and its neighbours'
+        features, computed once per sentence.
+        """
+        words = [w['word'] for w in sent]
+        lower = [w.lower() for w in words]
+        attrs = {
+            'lower': lower,
+            'isupper': [w.isupper() for w in words],
+            'istitle': [w.istitle() for w in words],
+        }
+        if self.use_gazetteers:
+            index = self.index
+            attrs['gazetteer_mask'] = [index.token_mask(w) if index is not None else 0 for w in lower]
+        return attrs
 
-    def word2features(self, sent, i):
+    def word2features(self, sent, i, span_features=None):
         """
         Extracts features for a single word in a sentence.
+        span_features: this token's entry of gazetteer_span_features(sent);
+        computed on the fly when omitted.
+        """
+        if span_features is None:
+            span_features = self.gazetteer_span_features(sent)[i]
+        # Only the word and its neighbours are needed
+        start = max(i - 1, 0)
+        window = sent[start:i + 2]
+        return self.assemble_features(window, i - start, self.sentence_attributes(window), span_features)
+
+    def assemble_features(self, sent, i, attrs, span_features):
+        """
+        Builds the features of sent[i] from precomputed sentence_attributes
+        and this token's gazetteer span features.
         """
         word = sent[i]['word']
         lemma = sent[i]['lemma']
@@ -142,9 +383,9 @@ class FeatureExtractor:
 
         features = {
             'bias': 1.0,
-            'word.lower()': word.lower(),
-            'word.isupper()': word.isupper(),
-            'word.istitle()': word.istitle(),
+            'word.lower()': attrs['lower'][i],
+            'word.isupper()': attrs['isupper'][i],
+            'word.istitle()': attrs['istitle'][i],
             'word.isdigit()': word.isdigit(),
             'word.has_apostrophe': "'" in word or "’" in word,
         }
@@ -192,53 +433,24 @@ class FeatureExtractor:
 
         # Gazetteer Features (Optional - controlled by self.use_gazetteers)
         if self.use_gazetteers:
-            # Multi-word Lookup via Windows
-            for g_name in ['kisiler', 'yerler', 'sirketler', 'kurumlar', 'film_muzik', 'topluluklar']:
-                # Single word membership
-                features[f'in_{g_name}_tokens'] = self.check_gazetteer(word, g_name, is_token=True)
-
-                # Contextual Match (is this word the START of a multi-word gazetteer entry?)
-                # Check current + next
-                if i < len(sent) - 1:
-                    bigram = f"{word} {sent[i+1]['word']}"
-                    if self.check_gazetteer(bigram, g_name):
-                        features[f'start_bigram_{g_name}'] = True
-
-                # Check current + next + next next
-                if i < len(sent) - 2:
-                    trigram = f"{word} {sent[i+1]['word']} {sent[i+2]['word']}"
-                    if self.check_gazetteer(trigram, g_name):
-                        features[f'start_trigram_{g_name}'] = True
-
-                # Check prev + current
-                if i > 0:
-                    prev_bigram = f"{sent[i-1]['word']} {word}"
-                    if self.check_gazetteer(prev_bigram, g_name):
-                        features[f'inside_bigram_{g_name}'] = True
-
-            # Specific keyword indicators (often tied to specific categories like Company/Org)
-            word_l = word.lower()
-            features.update({
-                'kw_holding': 'holding' in word_l,
-                'kw_bank': 'banka' in word_l,
-                'kw_company_suffix': any(s in word_l for s in ['a.ş', 'ltd', 'şirketi']),
-                'kw_group_suffix': any(s in word_l for s in ['grubu', 'kulübü', 'derneği', 'partisi']),
-                'kw_org_suffix': any(s in word_l for s in ['vakfı', 'üniversitesi', 'belediyesi'])
-            })
+            # Single word membership
+            mask = attrs['gazetteer_mask'][i]
+            for name, bit in self._token_gazetteer_bits:
+                features[name] = bool(mask & bit)
+
+            # Multi-word entries starting at, or running through, this word
+            for name in span_features:
+                features[name] = True
 
-            # Regex Features (Extended NER cues)
-            if re.search(r'(Derneği|Kulübü|Topluluğu)$', word):
-                features['suffix_group'] = True
-            if re.search(r'(Vakfı|Birliği|Fonu)$', word):
-                features['suffix_org'] = True
+            # Keyword and suffix cues from the keyword table
+            features.update(self.keywords.match(word))
 
         # Context Features
         if i > 0:
-            word1 = sent[i-1]['word']
             features.update({
-                '-1:word.lower()': word1.lower(),
-                '-1:word.istitle()': word1.istitle(),
-                '-1:word.isupper()': word1.isupper(),
+                '-1:word.lower()': attrs['lower'][i-1],
+                '-1:word.istitle()': attrs['istitle'][i-1],
+                '-1:word.isupper()': attrs['isupper'][i-1],
             })
             if self.use_morphology:
                 features['-1:lemma'] = sent[i-1]['lemma']
@@ -246,11 +458,10 @@ class FeatureExtractor:
             features['BOS'] = True
 
         if i < len(sent)-1:
-            word1 = sent[i+1]['word']
             features.update({
-                '+1:word.lower()': word1.lower(),
-                '+1:word.istitle()': word1.istitle(),
-                '+1:word.isupper()': word1.isupper(),
+                '+1:word.lower()': attrs['lower'][i+1],
+                '+1:word.istitle()': attrs['istitle'][i+1],
+                '+1:word.isupper()': attrs['isupper'][i+1],
             })
             if self.use_morphology:
                  features['+1:lemma'] = sent[i+1]['lemma']
@@ -259,17 +470,93 @@ class FeatureExtractor:
 
         return features
 
-    def sent2features(self, sent):
-        features_list = [self.word2features(sent, i) for i in range(len(sent))]
+    def _morph_signature(self, morph):
+        if not isinstance(morph, list):
+            return None
+        # Analyses come from the preprocessing caches, so the same list object
+        # recurs; the stored reference keeps its id from being reused
+        cached = self._morph_signatures.get(id(morph))
+        if cached is not None and cached[0] is morph:
+            return cached[1]
+        signature = tuple((m.get('Id', ''), m.get('Type'), m.get('HasChange', False), tuple(m.get('Labels', [])))
+                          for m in morph)
+        if len(self._morph_signatures) >= 100000:
+            self._morph_signatures.clear()
+        self._morph_signatures[id(morph)] = (morph, signature)
+        return signature
+
+    def _context_key(self, sent, i, span_features):
+        """Everything assemble_features reads for sent[i]: the word/lemma window, morphology and gazetteer spans."""
+        token = sent[i]
+        prev_token = (sent[i-1]['word'], sent[i-1]['lemma']) if i > 0 else None
+        next_token = (sent[i+1]['word'], sent[i+1]['lemma']) if i < len(sent)-1 else None
+        morph = None
+        if self.use_morphology:
+            morph = (
+                'nuve_morph' in token,
+                self._morph_signature(token.get('nuve_morph', token.get('morph', []))),
+                self._morph_signature(token.get('zemberek_morph')),
+            )
+        return (token['word'], token['lemma'], token['pos'], morph, prev_token, next_token,
+                frozenset(span_features))
+
+    def feature_cache_info(self):
+        """Hit/miss statistics of the token feature memo."""
+        return self.feature_cache.info()
+
+    def corpus2features(self, sentences, batch_size=32, chunk_size=1024):
+        """
+        sent2features over an iterable of processed sentences, yielded in order.
+        Embeddings, when enabled, are computed in batches across sentences.
+        """
+        chunk = []
+        for sent in sentences:
+            chunk.append(sent)
+            if len(chunk) == chunk_size:
+                yield from self._chunk2features(chunk, batch_size)
+                chunk = []
+        if chunk:
+            yield from self._chunk2features(chunk, batch_size)
+
+    def _chunk2features(self, chunk, batch_size):
+        if not (self.use_embeddings and self.embedding_extractor):
+            return [self.sent2features(sent) for sent in chunk]
+        embeddings = self.embedding_extractor.get_batch_embeddings(
+            [[w['word'] for w in sent] for sent in chunk], batch_size=batch_size)
+        embedding_features = self.embedding_features(embeddings)
+        return [self.sent2features(sent, emb) for sent, emb in zip(chunk, embedding_features)]
+
+    def sent2features(self, sent, embedding_features=None):
+        """
+        Features of every token in the sentence. Tokens seen before in an
+        identical context share one memoized dict; callers must not mutate it.
+        embedding_features: precomputed per-token embedding features (see corpus2features)
+        """
+        span_features = self.gazetteer_span_features(sent)
+        if self.feature_cache.maxsize <= 0:
+            attrs = self.sentence_attributes(sent)
+            features_list = [self.assemble_features(sent, i, attrs, span_features[i]) for i in range(len(sent))]
+        else:
+            attrs = None
+            features_list = []
+            for i in range(len(sent)):
+                key = self._context_key(sent, i, span_features[i])
+                features = self.feature_cache.get(key)
+                if features is None:
+                    if attrs is None:
+                        attrs = self.sentence_attributes(sent)
+                    features = self.assemble_features(sent, i, attrs, span_features[i])
+                    self.feature_cache.put(key, features)
+                features_list.append(features)
 
         # Add embedding features if enabled
         if self.use_embeddings and self.embedding_extractor:
-            tokens = [w['word'] for w in sent]
-            embeddings = self.embedding_extractor.get_sentence_embeddings(tokens)
-            for i, emb in enumerate(embeddings):
-                # We use a very simplified mapping or just a few dimensions to avoid exploding CRF features
-                # In a real scenario, we might use PCA. Here we'll just use the first 16 values as a demo.
-                for j in range(16):
-                    features_list[i][f'emb_{j}'] = float(emb[j])
+            # Embeddings depend on the whole sentence; do not touch the shared dicts
+            features_list = [dict(features) for features in features_list]
+            if embedding_features is None:
+                tokens = [w['word'] for w in sent]
+                embedding_features = self.embedding_features([self.embedding_extractor.get_sentence_embeddings(tokens)])[0]
+            for features, emb_features in zip(features_list, embedding_features):
+                features.update(emb_features)
 
         return features_list
@@ -0,0 +1,313 @@
+import os
+import sys
+import logging
+from collections import defaultdict, deque
+from functools import lru_cache
+
+import numpy as np
+
+from src.string_table import StringTable
+from src.array_file import pack, read_header, map_arrays, map_file, write_atomic
+
+INDEX_FILENAME = "gazetteers.idx"
+INDEX_MAGIC = b"NERGAZ01"
+INDEX_VERSION = 1
+
+
+def read_gazetteers(gazetteer_dir):
+    """
+    Reads gazetteers/*.txt into sets.
+    Returns: full_names {category: entries}, tokens_set {category: entry tokens}, all lowercased.
+    """
+    full_names = {}
+    tokens_set = {}
+    if not os.path.exists(gazetteer_dir):
+        return full_names, tokens_set
+
+    for filename in os.listdir(gazetteer_dir):
+        if filename.endswith(".txt"):
+            name = filename.replace(".txt", "")
+            path = os.path.join(gazetteer_dir, filename)
+            full_names[name] = set()
+            tokens_set[name] = set()
+
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = line.strip().lower()
+                    if entry:
+                        full_names[name].add(entry)
+                        # Also add individual tokens
+                        for t in entry.split():
+                            tokens_set[name].add(t)
+    return full_names, tokens_set
+
+
+def gazetteer_signature(gazetteer_dir):
+    """Identifies the current gazetteer files, so a stale index is rebuilt."""
+    signature = []
+    for filename in sorted(os.listdir(gazetteer_dir)):
+        if filename.endswith(".txt"):
+            st = os.stat(os.path.join(gazetteer_dir, filename))
+            signature.append([filename, st.st_size, st.st_mtime_ns])
+    return signature
+
+
+class GazetteerMatcher:
+    """
+    Token-level Aho-Corasick automaton over gazetteer entries.
+    A sentence is scanned once; every run of tokens whose lowercased form is a
+    gazetteer entry is reported as a (start, end, category) span, whatever its length.
+    """
+
+    def __init__(self):
+        self.categories = []
+        self._category_ids = {}
+        self._goto = {}        # (state, token) -> state
+        self._fail = [0]
+        self._outputs = [()]   # state -> ((length, category_id), ...)
+        self._depth = [0]
+
+    def add(self, entry_tokens, category):
+        """Adds one entry, given as its (lowercased) tokens."""
+        if category not in self._category_ids:
+            self._category_ids[category] = len(self.categories)
+            self.categories.append(category)
+
+        state = 0
+        for token in entry_tokens:
+            child = self._goto.get((state, token))
+            if child is None:
+                child = len(self._fail)
+                self._goto[(state, token)] = child
+                self._fail.append(0)
+                self._outputs.append(())
+                self._depth.append(self._depth[state] + 1)
+            state = child
+
+        output = (self._depth[state], self._category_ids[category])
+        if output not in self._outputs[state]:
+            self._outputs[state] += (output,)
+
+    def build(self):
+        """Computes failure links; call once after all entries are added."""
+        children = defaultdict(list)
+        for (state, token), child in self._goto.items():
+            children[state].append((token, child))
+
+        queue = deque(child for _, child in children[0])
+        while queue:
+            state = queue.popleft()
+            for token, child in children[state]:
+                f = self._fail[state]
+                while f and (f, token) not in self._goto:
+                    f = self._fail[f]
+                self._fail[child] = self._goto.get((f, token), 0)
+                # A match ending here also ends every suffix match
+                self._outputs[child] += self._outputs[self._fail[child]]
+                queue.append(child)
+        return self
+
+    def find_spans(self, tokens):
+        """Returns [(start, end, category), ...] for all entries found in tokens."""
+        spans = []
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for i, token in enumerate(tokens):
+            token = token.lower()
+            while state and (state, token) not in goto:
+                state = fail[state]
+            state = goto.get((state, token), 0)
+            for length, category_id in outputs[state]:
+                spans.append((i - length + 1, i + 1, self.categories[category_id]))
+        return spans
+
+    @classmethod
+    def from_gazetteers(cls, full_names):
+        """Builds a matcher from {category: set of lowercased entries}."""
+        matcher = cls()
+        for category, entries in full_names.items():
+            for entry in entries:
+                # Entries are matched against space-joined tokens
+                matcher.add(entry.split(" "), category)
+        return matcher.build()
+
+
+class GazetteerIndex:
+    """
+    Compiled, read-only form of the gazetteers: a string table of entry tokens,
+    per-token category masks and the GazetteerMatcher automaton as flat arrays.
+    Loaded from a memory-mapped file, so construction is near-instant and
+    processes share the pages.
+    """
+
+    def __init__(self, buffer, header):
+        self._buffer = buffer
+        self.header = header
+        self.categories = header["categories"]
+        arrays = map_arrays(buffer, header)
+        self.vocab = StringTable(arrays["vocab_blob"], arrays["vocab_offsets"])
+        self.token_masks = arrays["token_masks"]
+        self.goto_keys = arrays["goto_keys"]
+        self.goto_next = arrays["goto_next"]
+        self.fail = arrays["fail"]
+        self.out_ptr = arrays["out_ptr"]
+        self.out_length = arrays["out_length"]
+        self.out_category = arrays["out_category"]
+        self._vocab_size = len(self.vocab)
+        self._category_ids = {c: i for i, c in enumerate(self.categories)}
+        self._step = lru_cache(maxsize=1 << 18)(self._goto)
+
+    def _goto(self, state, token_id):
+        key = np.uint64(state * self._vocab_size + token_id)
+        i = int(np.searchsorted(self.goto_keys, key))
+        if i < len(self.goto_keys) and self.goto_keys[i] == key:
+            return int(self.goto_next[i])
+        return -1
+
+    def _outputs(self, state):
+        for j in range(self.out_ptr[state], self.out_ptr[state + 1]):
+            yield int(self.out_length[j]), int(self.out_category[j])
+
+    def find_spans(self, tokens):
+        """Same as GazetteerMatcher.find_spans."""
+        spans = []
+        state = 0
+        for i, token in enumerate(tokens):
+            token_id = self.vocab.find(token.lower())
+            if token_id < 0:
+                # Unknown tokens have no transition from any state
+                state = 0
+                continue
+            while True:
+                child = self._step(state, token_id)
+                if child >= 0 or state == 0:
+                    break
+                state = int(self.fail[state])
+            state = max(child, 0)
+            for length, category_id in self._outputs(state):
+                spans.append((i - length + 1, i + 1, self.categories[category_id]))
+        return spans
+
+    def token_mask(self, token):
+        """Bitmask of the categories (by position in self.categories) containing the token."""
+        token_id = self.vocab.find(token)
+        return int(self.token_masks[token_id]) if token_id >= 0 else 0
+
+    def has_token(self, token, category):
+        """True if some entry of the category contains the (lowercased) token."""
+        token_id = self.vocab.find(token)
+        category_id = self._category_ids.get(category)
+        if token_id < 0 or category_id is None:
+            return False
+        return bool(self.token_masks[token_id] & (1 << category_id))
+
+    def contains(self, entry, category):
+        """True if the (lowercased) entry is in the category."""
+        category_id = self._category_ids.get(category)
+        tokens = entry.split(" ")
+        state = 0
+        for token in tokens:
+            token_id = self.vocab.find(token)
+            state = self._step(state, token_id) if token_id >= 0 else -1
+            if state < 0:
+                return False
+        return (len(tokens), category_id) in self._outputs(state)
+
+    @staticmethod
+    def compile(gazetteer_dir):
+        """Compiles gazetteer_dir/*.txt into index bytes."""
+        full_names, tokens_set = read_gazetteers(gazetteer_dir)
+        categories = sorted(full_names)
+        if len(categories) > 32:
+            raise ValueError("Gazetteer index supports at most 32 categories")
+        category_ids = {c: i for i, c in enumerate(categories)}
+        matcher = GazetteerMatcher.from_gazetteers(full_names)
+
+        entry_tokens = {token for (_, token) in matcher._goto}
+        entry_tokens.update(t for tokens in tokens_set.values() for t in tokens)
+        vocab_blob, vocab_offsets = StringTable.build(entry_tokens)
+        vocab = StringTable(vocab_blob, vocab_offsets)
+
+        token_masks = np.zeros(len(vocab), dtype=np.uint32)
+        for category, tokens in tokens_set.items():
+            bit = np.uint32(1 << category_ids[category])
+            for t in tokens:
+                token_masks[vocab.find(t)] |= bit
+
+        keys = np.array([state * len(vocab) + vocab.find(token) for (state, token) in matcher._goto],
+                        dtype=np.uint64)
+        order = np.argsort(keys)
+        goto_keys = keys[order]
+        goto_next = np.fromiter(matcher._goto.values(), dtype=np.int32, count=len(keys))[order]
+
+        out_ptr = np.zeros(len(matcher._outputs) + 1, dtype=np.int32)
+        np.cumsum([len(o) for o in matcher._outputs], out=out_ptr[1:])
+        flat = [out for outputs in matcher._outputs for out in outputs]
+        out_length = np.array([length for length, _ in flat], dtype=np.int32)
+        out_category = np.array([category_ids[matcher.categories[c]] for _, c in flat], dtype=np.uint8)
+
+        arrays = {
+            "vocab_blob": vocab_blob,
+            "vocab_offsets": vocab_offsets,
+            "token_masks": token_masks,
+            "goto_keys": goto_keys,
+            "goto_next": goto_next,
+            "fail": np.asarray(matcher._fail, dtype=np.int32),
+            "out_ptr": out_ptr,
+            "out_length": out_length,
+            "out_category": out_category,
+        }
+        header = {
+            "version": INDEX_VERSION,
+            "signature": gazetteer_signature(gazetteer_dir),
+            "categories": categories,
+        }
+        return pack(INDEX_MAGIC, header, arrays)
+
+    @classmethod
+    def load(cls, gazetteer_dir, path=None):
+        """
+        Memory-maps the compiled index, (re)building it first if it is missing
+        or older than the gazetteer files. Returns None if there are no gazetteers.
+        """
+        if not os.path.exists(gazetteer_dir):
+            return None
+        path = path or os.path.join(gazetteer_dir, INDEX_FILENAME)
+        signature = gazetteer_signature(gazetteer_dir)
+        if not signature:
+            return None
+
+        index = cls._open(path)
+        if index is not None and index.header.get("signature") == signature:
+            return index
+
+        logging.info(f"Compiling gazetteer index: {path}")
+        data = cls.compile(gazetteer_dir)
+        try:
+            write_atomic(path, data)
+        except OSError as e:
+            logging.warning(f"Could not write gazetteer index ({e}), keeping it in memory")
+            return cls(data, read_header(data, INDEX_MAGIC))
+        return cls._open(path)
+
+    @classmethod
+    def _open(cls, path):
+        try:
+            buffer = map_file(path)
+            header = read_header(buffer, INDEX_MAGIC)
+        except (OSError, ValueError):
+            return None
+        if header.get("version") != INDEX_VERSION:
+            return None
+        return cls(buffer, header)
+
+
+if __name__ == "__main__":
+    # Build step: python -m src.gazetteer_matcher [gazetteer_dir]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    index = GazetteerIndex.load(sys.argv[1] if len(sys.argv) > 1 else "gazetteers")
+    if index is None:
+        logging.error("No gazetteers found")
+    else:
+        logging.info(f"Gazetteer index ready: {len(index.vocab)} tokens, {len(index.fail)} states, "
+                     f"categories {index.categories}")
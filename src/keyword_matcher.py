@@ -0,0 +1,61 @@
+from functools import lru_cache
+
+# Keyword and suffix cues for word2features. Each entry is one feature:
+#   patterns        strings to look for
+#   match           "contains" (default), "prefix", "suffix" or "exact"
+#   case_sensitive  match the word as written instead of lowercased (default False)
+#   emit_false      always emit the feature, not only when it fires (default True)
+DEFAULT_KEYWORD_TABLE = [
+    # Specific keyword indicators (often tied to specific categories like Company/Org)
+    {"feature": "kw_holding", "patterns": ["holding"]},
+    {"feature": "kw_bank", "patterns": ["banka"]},
+    {"feature": "kw_company_suffix", "patterns": ["a.ş", "ltd", "şirketi"]},
+    {"feature": "kw_group_suffix", "patterns": ["grubu", "kulübü", "derneği", "partisi"]},
+    {"feature": "kw_org_suffix", "patterns": ["vakfı", "üniversitesi", "belediyesi"]},
+    # Extended NER cues
+    {"feature": "suffix_group", "patterns": ["Derneği", "Kulübü", "Topluluğu"],
+     "match": "suffix", "case_sensitive": True, "emit_false": False},
+    {"feature": "suffix_org", "patterns": ["Vakfı", "Birliği", "Fonu"],
+     "match": "suffix", "case_sensitive": True, "emit_false": False},
+]
+
+MATCH_TYPES = ("contains", "prefix", "suffix", "exact")
+
+
+class KeywordMatcher:
+    """
+    Evaluates a keyword table against a word. The table is compiled once and
+    results are memoized per surface form, so repeated words cost one lookup.
+    """
+
+    def __init__(self, table=None, cache_size=65536):
+        self.table = DEFAULT_KEYWORD_TABLE if table is None else table
+        self.rules = []
+        for entry in self.table:
+            match = entry.get("match", "contains")
+            if match not in MATCH_TYPES:
+                raise ValueError(f"Unknown match type for {entry['feature']}: {match}")
+            case_sensitive = entry.get("case_sensitive", False)
+            patterns = tuple(p if case_sensitive else p.lower() for p in entry["patterns"])
+            if match == "exact":
+                patterns = frozenset(patterns)
+            self.rules.append((entry["feature"], match, patterns, case_sensitive, entry.get("emit_false", True)))
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, word):
+        """Returns ((feature, value), ...) for the word."""
+        lower = word.lower()
+        features = []
+        for name, match, patterns, case_sensitive, emit_false in self.rules:
+            text = word if case_sensitive else lower
+            if match == "contains":
+                hit = any(p in text for p in patterns)
+            elif match == "suffix":
+                hit = text.endswith(patterns)
+            elif match == "prefix":
+                hit = text.startswith(patterns)
+            else:
+                hit = text in patterns
+            if hit or emit_false:
+                features.append((name, hit))
+        return tuple(features)
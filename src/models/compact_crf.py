@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import logging
+
+import numpy as np
+
+from src.array_file import pack, read_header, map_arrays, map_file, write_atomic
+from src.feature_encoding import FeatureEncoder, EncodedCorpus, crfsuite_attributes, _ranges
+from src.string_table import StringTable
+from src.models.viterbi import viterbi, viterbi_batch, marginals, nbest
+
+COMPACT_MAGIC = b"NERCRF01"
+COMPACT_VERSION = 1
+
+
+class CompactCRF:
+    """
+    Inference-only form of a trained CRF: attribute string table, label table,
+    state weights grouped by attribute (CSR) and a dense transition matrix, in
+    one memory-mapped file. The header records the FeatureExtractor config the
+    model was trained with. Provides the parts of sklearn_crfsuite.CRF that
+    CRFModel uses (predict, predict_marginals, classes_, state_features_,
+    transition_features_); decoding is done in NumPy (src.models.viterbi).
+    """
+
+    def __init__(self, buffer, header):
+        self._buffer = buffer
+        self.header = header
+        self.classes_ = header["labels"]
+        self.feature_config = header.get("feature_config")
+        arrays = map_arrays(buffer, header)
+        self.attributes = StringTable(arrays["attr_blob"], arrays["attr_offsets"])
+        self.state_ptr = arrays["state_ptr"]
+        self.state_label = arrays["state_label"]
+        self.state_weight = arrays["state_weight"]
+        self.transitions = arrays["transitions"].reshape(len(self.classes_), len(self.classes_))
+        self._transitions = self.transitions.astype(np.float64)
+        self._attribute_index = None
+        # Hash-encoded models know attributes by their hashed id
+        encoder = header.get("encoder")
+        self._encoder = FeatureEncoder("hash", encoder["n_features"]) if encoder else None
+
+    @staticmethod
+    def compile(crf, encoder=None, feature_config=None):
+        """Compact file bytes for a trained sklearn_crfsuite.CRF (and the encoder it was trained with)."""
+        labels = list(crf.classes_)
+        label_ids = {label: i for i, label in enumerate(labels)}
+        hashed = encoder is not None and encoder.mode == "hash"
+
+        def attribute_name(attribute):
+            # Vocabulary-encoded models get their attribute names back
+            if encoder is None or hashed:
+                return attribute
+            return encoder.attribute_name(int(attribute))
+
+        state_features = {}
+        for (attribute, label), weight in crf.state_features_.items():
+            if weight != 0:
+                state_features.setdefault(attribute_name(attribute), []).append((label_ids[label], weight))
+
+        attr_blob, attr_offsets = StringTable.build(state_features)
+        attributes = StringTable(attr_blob, attr_offsets)
+        state_ptr = np.zeros(len(attributes) + 1, dtype=np.int32)
+        np.cumsum([len(state_features[a]) for a in attributes], out=state_ptr[1:])
+        flat = [entry for a in attributes for entry in state_features[a]]
+        state_label = np.array([label for label, _ in flat], dtype=np.uint16)
+        state_weight = np.array([weight for _, weight in flat], dtype=np.float32)
+
+        transitions = np.zeros((len(labels), len(labels)), dtype=np.float32)
+        for (label_from, label_to), weight in crf.transition_features_.items():
+            transitions[label_ids[label_from], label_ids[label_to]] = weight
+
+        header = {
+            "version": COMPACT_VERSION,
+            "labels": labels,
+            "encoder": {"n_features": encoder.n_features} if hashed else None,
+            "feature_config": feature_config,
+        }
+        return _pack_model(header, attr_blob, attr_offsets, state_ptr, state_label, state_weight, transitions)
+
+    @classmethod
+    def from_crf(cls, crf, encoder=None, feature_config=None):
+        data = cls.compile(crf, encoder, feature_config)
+        return cls(data, read_header(data, COMPACT_MAGIC))
+
+    def save(self, filepath):
+        if os.path.dirname(filepath):
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        write_atomic(filepath, bytes(self._buffer))
+
+    @classmethod
+    def load(cls, filepath):
+        buffer = map_file(filepath)
+        header = read_header(buffer, COMPACT_MAGIC)
+        if header.get("version") != COMPACT_VERSION:
+            raise ValueError(f"Unsupported compact CRF version {header.get('version')} in {filepath}")
+        return cls(buffer, header)
+
+    @staticmethod
+    def is_compact(filepath):
+        with open(filepath, "rb") as f:
+            return f.read(len(COMPACT_MAGIC)) == COMPACT_MAGIC
+
+    def __reduce__(self):
+        # Memory maps do not pickle; ship the bytes (e.g. to prediction workers)
+        return (CompactCRF, (bytes(self._buffer), self.header))
+
+    def prune(self, threshold):
+        """
+        Copy without the state weights whose magnitude is at most threshold
+        (0 drops exact zeros); attributes left without weights are removed.
+        """
+        counts = np.diff(self.state_ptr)
+        keep = np.abs(self.state_weight) > threshold
+        kept_counts = np.bincount(np.repeat(np.arange(len(counts)), counts)[keep], minlength=len(counts))
+        kept_attributes = np.flatnonzero(kept_counts)
+
+        # A subset of a sorted table is still sorted, so attribute ids stay in order
+        attr_blob, attr_offsets = StringTable.build(self.attributes[int(i)] for i in kept_attributes)
+        state_ptr = np.zeros(len(kept_attributes) + 1, dtype=np.int32)
+        np.cumsum(kept_counts[kept_attributes], out=state_ptr[1:])
+        header = {k: v for k, v in self.header.items() if k != "arrays"}
+        header["pruned_below"] = threshold
+        data = _pack_model(header, attr_blob, attr_offsets, state_ptr,
+                           self.state_label[keep], self.state_weight[keep], self.transitions)
+        return CompactCRF(data, read_header(data, COMPACT_MAGIC))
+
+    @property
+    def nbytes(self):
+        return len(self._buffer)
+
+    def config_mismatches(self, feature_config):
+        """Names of the FeatureExtractor settings that differ from the ones the model was trained with."""
+        if self.feature_config is None:
+            return []
+        keys = set(self.feature_config) | set(feature_config)
+        return sorted(k for k in keys if self.feature_config.get(k) != feature_config.get(k))
+
+    def _token_attributes(self, features, encoded=False):
+        # Sentences of a hash-encoded corpus already hold hashed ids as attributes
+        if self._encoder is not None and not encoded:
+            ids, weights = self._encoder.encode_token(features)
+            return zip(map(str, ids), weights)
+        return crfsuite_attributes(features)
+
+    def _attribute_ids(self):
+        # Built on first use: a dict beats binary searches over the mapped table
+        # once many sentences are tagged, and keeps load() itself instant
+        if self._attribute_index is None:
+            self._attribute_index = {attribute: i for i, attribute in enumerate(self.attributes)}
+        return self._attribute_index
+
+    def emissions(self, xseq, encoded=False):
+        """(tokens x labels) state scores of a sentence (list of feature dicts)."""
+        return self.batch_emissions([xseq], encoded)[0]
+
+    def batch_emissions(self, X, encoded=False):
+        """
+        State scores for several sentences in one pass: the active attributes of
+        all tokens select rows of the sparse attribute x label weight matrix,
+        which are summed per token with a single bincount. encoded: X comes from
+        a hash-mode EncodedCorpus rather than feature dicts.
+        """
+        n_labels = len(self.classes_)
+        lengths = [len(xseq) for xseq in X]
+        positions, attr_ids, values = [], [], []
+        find = self._attribute_ids().get
+        t = 0
+        for xseq in X:
+            for features in xseq:
+                for attribute, value in self._token_attributes(features, encoded):
+                    attr_id = find(attribute, -1)
+                    if attr_id >= 0:
+                        positions.append(t)
+                        attr_ids.append(attr_id)
+                        values.append(value)
+                t += 1
+
+        scores = np.zeros(t * n_labels)
+        if attr_ids:
+            attr_ids = np.array(attr_ids)
+            starts, ends = self.state_ptr[attr_ids], self.state_ptr[attr_ids + 1]
+            index = _ranges(starts, ends)
+            cells = np.repeat(positions, ends - starts) * n_labels + self.state_label[index]
+            weights = np.repeat(values, ends - starts) * self.state_weight[index]
+            scores = np.bincount(cells, weights=weights, minlength=t * n_labels)
+        scores = scores.reshape(t, n_labels)
+        bounds = np.cumsum([0] + lengths).tolist()
+        return [scores[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    def _check_input(self, X):
+        """Whether X is a hash-encoded corpus; vocabulary ids do not survive export."""
+        if not isinstance(X, EncodedCorpus):
+            return False
+        if X.encoder.mode != "hash" or self._encoder is None:
+            raise ValueError("Compact CRF models take feature dicts or hash-encoded corpora of hash-encoded models")
+        if X.encoder.n_features != self._encoder.n_features:
+            raise ValueError(f"Corpus hashed to {X.encoder.n_features} features, model to {self._encoder.n_features}")
+        return True
+
+    def predict_single(self, xseq):
+        path, _ = viterbi(self.emissions(xseq), self._transitions)
+        return [self.classes_[i] for i in path]
+
+    def predict(self, X, batch_size=256):
+        """
+        Tags sentences by padded batch decoding; sentences are grouped by length
+        so batches carry little padding. Output is in input order.
+        """
+        encoded = self._check_input(X)
+        X = list(X)
+        order = sorted(range(len(X)), key=lambda k: len(X[k]))
+        tags = [None] * len(X)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            emissions = self.batch_emissions([X[k] for k in batch], encoded)
+            lengths = np.array([len(e) for e in emissions])
+            padded = np.zeros((len(batch), lengths.max(initial=0), len(self.classes_)))
+            for row, e in enumerate(emissions):
+                padded[row, :len(e)] = e
+            paths, _ = viterbi_batch(padded, lengths, self._transitions)
+            for k, path in zip(batch, paths):
+                tags[k] = [self.classes_[i] for i in path]
+        return tags
+
+    def predict_marginals(self, X):
+        """Per-token {label: probability} dicts, like sklearn_crfsuite.CRF.predict_marginals."""
+        encoded = self._check_input(X)
+        X = list(X)
+        return [
+            [dict(zip(self.classes_, row)) for row in marginals(e, self._transitions).tolist()]
+            for e in self.batch_emissions(X, encoded)
+        ]
+
+    def predict_nbest(self, xseq, n=5):
+        """The n best (labels, score) sequences for a sentence, best first."""
+        return [([self.classes_[i] for i in path], score)
+                for path, score in nbest(self.emissions(xseq), self._transitions, n)]
+
+    @property
+    def state_features_(self):
+        counts = np.diff(self.state_ptr)
+        names = np.repeat(np.arange(len(self.attributes)), counts)
+        return {
+            (self.attributes[int(a)], self.classes_[int(label)]): float(weight)
+            for a, label, weight in zip(names, self.state_label, self.state_weight)
+        }
+
+    @property
+    def transition_features_(self):
+        return {
+            (label_from, label_to): float(self.transitions[i, j])
+            for i, label_from in enumerate(self.classes_)
+            for j, label_to in enumerate(self.classes_)
+        }
+
+
+def _pack_model(header, attr_blob, attr_offsets, state_ptr, state_label, state_weight, transitions):
+    return pack(COMPACT_MAGIC, header, {
+        "attr_blob": attr_blob,
+        "attr_offsets": attr_offsets,
+        "state_ptr": state_ptr,
+        "state_label": state_label,
+        "state_weight": state_weight,
+        "transitions": np.ascontiguousarray(transitions).ravel(),
+    })
+
+
+def load_feature_config(config):
+    """
+    Feature config from a JSON string or from an experiment result file
+    (results/experiments/<id>.json), whose config.feature_config is used.
+    """
+    if os.path.exists(config):
+        with open(config, encoding="utf-8") as f:
+            return json.load(f)["config"]["feature_config"]
+    return json.loads(config)
+
+
+if __name__ == "__main__":
+    # Export step: python -m src.models.compact_crf <model> <feature config> [<output.crf>]
+    # The feature config is required: it is recorded in the file so that mismatched
+    # extractors can be detected at load time. It is either run_experiment-style JSON,
+    # e.g. '{"use_gazetteers": true, "use_morphology": false}', or the experiment's result file.
+    from src.features import FeatureExtractor
+    from src.models.crf_model import CRFModel
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 3:
+        sys.exit("Usage: python -m src.models.compact_crf <model> <feature config JSON or experiment result> [<output.crf>]")
+    source = sys.argv[1]
+    extractor = FeatureExtractor.from_config(load_feature_config(sys.argv[2]), model_path=source)
+    target = sys.argv[3] if len(sys.argv) > 3 else CRFModel.compact_path(source)
+    CRFModel.load(source).export(target, extractor)
+    logging.info(f"{source}: {os.path.getsize(source)} bytes -> {target}: {os.path.getsize(target)} bytes")
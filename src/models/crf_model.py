@@ -4,8 +4,19 @@ import logging
 import joblib
 import os
 import json
+import pickle
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from src.feature_encoding import EncodedCorpus
+from src.models.compact_crf import CompactCRF
 
 class CRFModel:
+    # Set when trained on an EncodedCorpus; feature dicts are then encoded on predict.
+    # Class-level default keeps models pickled before encoders existed loadable.
+    encoder = None
+
     def __init__(self, c1=0.1, c2=0.1):
         self.model = sklearn_crfsuite.CRF(
             algorithm='lbfgs',
@@ -14,6 +25,7 @@ class CRFModel:
             max_iterations=100,
             all_possible_transitions=True
         )
+        self.encoder = None
 
     def train(self, X_train, y_train):
         """
@@ -22,6 +34,8 @@ class CRFModel:
         y_train: List of label lists
         """
         logging.info("Training CRF Model...")
+        if isinstance(X_train, EncodedCorpus):
+            self.encoder = X_train.encoder.freeze()
         self.model.fit(X_train, y_train)
         logging.info("CRF Training Complete.")
 
@@ -29,7 +43,12 @@ class CRFModel:
         """Returns the top N state features and their weights."""
         from collections import Counter
         features = Counter(self.model.state_features_).most_common(n)
-        return [{"feature": f, "weight": w} for f, w in features]
+        return [{"feature": (self._attribute_name(f[0]), f[1]), "weight": w} for f, w in features]
+
+    def _attribute_name(self, attribute):
+        if self.encoder is None:
+            return attribute
+        return self.encoder.attribute_name(attribute)
 
     def get_top_transitions(self, n=20):
         """Returns the top N transition features and their weights."""
@@ -41,6 +60,11 @@ class CRFModel:
         """Saves the model to a joblib file."""
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         joblib.dump(self.model, filepath)
+        if self.encoder is not None:
+            joblib.dump(self.encoder, self.encoder_path(filepath))
+        elif os.path.exists(self.encoder_path(filepath)):
+            # load() would attach an encoder left over from an earlier, encoded model
+            os.remove(self.encoder_path(filepath))
         logging.info(f"Model saved to {filepath}")
 
     def save_weights(self, filepath):
@@ -54,8 +78,72 @@ class CRFModel:
             json.dump(weights, f, indent=4, ensure_ascii=False)
         logging.info(f"Weights saved to {filepath}")
 
+    @staticmethod
+    def encoder_path(filepath):
+        return f"{filepath}.encoder.joblib"
+
+    @staticmethod
+    def compact_path(filepath):
+        return f"{os.path.splitext(filepath)[0]}.crf"
+
+    def export(self, filepath, extractor=None):
+        """
+        Writes the compact inference-only format (see src.models.compact_crf),
+        recording the config of the FeatureExtractor the model was trained with.
+        """
+        compact = CompactCRF.from_crf(self.model, self.encoder, extractor.get_config() if extractor else None)
+        compact.save(filepath)
+        logging.info(f"Compact model exported to {filepath}")
+        return compact
+
+    def _encode(self, X):
+        if self.encoder is None or isinstance(X, EncodedCorpus):
+            return X
+        return self.encoder.encode(X)
+
     def predict(self, X_test):
-        return self.model.predict(X_test)
+        return self.model.predict(self._encode(X_test))
+
+    def predict_batch(self, X, workers=None, chunk_size=500):
+        """
+        Tags an iterable of sentences in chunks spread over `workers` processes,
+        each holding its own loaded tagger. Yields tag sequences in input order.
+        """
+        workers = workers or os.cpu_count() or 1
+        chunks = self._chunks(X, chunk_size)
+        if workers == 1:
+            for chunk in chunks:
+                yield from self.predict(chunk)
+            return
+
+        # Spawned workers unpickle the model once, at startup
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_predict_worker, initargs=(pickle.dumps(self),))
+        try:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_predict_chunk, chunk))
+                # Bounded read-ahead keeps memory flat on large collections
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _chunks(X, chunk_size):
+        if isinstance(X, EncodedCorpus):
+            # Slices stay encoded arrays, which are cheap to send to workers
+            for start in range(0, len(X), chunk_size):
+                yield X[start:start + chunk_size]
+            return
+        it = iter(X)
+        while True:
+            chunk = list(itertools.islice(it, chunk_size))
+            if not chunk:
+                return
+            yield chunk
 
     def evaluate(self, X_test, y_test):
         y_pred = self.predict(X_test)
@@ -67,12 +155,39 @@ class CRFModel:
         return f1, report
 
     @classmethod
-    def load(cls, filepath):
-        """Loads a model from a joblib file."""
+    def load(cls, filepath, extractor=None):
+        """
+        Loads a model from a joblib file or a compact export. For compact models,
+        a warning is logged if extractor's config differs from the training one.
+        """
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"No model found at {filepath}")
 
         instance = cls()
+        if CompactCRF.is_compact(filepath):
+            instance.model = CompactCRF.load(filepath)
+            mismatches = instance.model.config_mismatches(extractor.get_config()) if extractor else []
+            if mismatches:
+                logging.warning(f"{filepath} was trained with different feature settings: {', '.join(mismatches)}")
+            logging.info(f"Compact model loaded from {filepath}")
+            return instance
+
         instance.model = joblib.load(filepath)
+        if os.path.exists(cls.encoder_path(filepath)):
+            instance.encoder = joblib.load(cls.encoder_path(filepath))
         logging.info(f"Model loaded from {filepath}")
         return instance
+
+
+_predict_worker = None
+
+
+def _init_predict_worker(model_bytes):
+    global _predict_worker
+    _predict_worker = pickle.loads(model_bytes)
+    # Open the crfsuite tagger up front rather than on the first chunk; compact models have none
+    getattr(_predict_worker.model, "tagger_", None)
+
+
+def _predict_chunk(chunk):
+    return _predict_worker.predict(chunk)
@@ -0,0 +1,103 @@
+"""
+NumPy decoding for first-order linear-chain CRFs (as trained by crfsuite,
+which has no start/end transitions). Scores are (tokens x labels) emission
+matrices plus a (labels x labels) transition matrix, indexed [from, to].
+"""
+import numpy as np
+
+
+def viterbi(emissions, transitions):
+    """Best label index path and its score for one sentence."""
+    paths, scores = viterbi_batch(emissions[None], np.array([len(emissions)]), transitions)
+    return paths[0], scores[0]
+
+
+def viterbi_batch(emissions, lengths, transitions):
+    """
+    Decodes a padded (sentences x max_len x labels) batch at once.
+    Positions past a sentence's length are ignored. Returns (paths, scores).
+    """
+    n_sent, max_len, n_labels = emissions.shape
+    lengths = np.asarray(lengths)
+    if max_len == 0:
+        return [[] for _ in range(n_sent)], np.zeros(n_sent)
+
+    best = emissions[:, 0].astype(np.float64)
+    backpointers = np.zeros((n_sent, max_len, n_labels), dtype=np.int32)
+    for t in range(1, max_len):
+        candidates = best[:, :, None] + transitions[None]
+        pointers = candidates.argmax(axis=1)
+        step = np.take_along_axis(candidates, pointers[:, None, :], axis=1)[:, 0] + emissions[:, t]
+        active = t < lengths
+        # Finished sentences keep their final scores
+        best = np.where(active[:, None], step, best)
+        backpointers[:, t] = pointers
+
+    last = best.argmax(axis=1)
+    scores = best[np.arange(n_sent), last]
+    paths = []
+    for k in range(n_sent):
+        path = [int(last[k])]
+        for t in range(lengths[k] - 1, 0, -1):
+            path.append(int(backpointers[k, t, path[-1]]))
+        paths.append(path[::-1] if lengths[k] else [])
+    return paths, scores
+
+
+def _logsumexp(a, axis):
+    peak = a.max(axis=axis, keepdims=True)
+    return np.squeeze(peak, axis=axis) + np.log(np.exp(a - peak).sum(axis=axis))
+
+
+def marginals(emissions, transitions):
+    """(tokens x labels) marginal label probabilities, by forward-backward in log space."""
+    n_tokens, n_labels = emissions.shape
+    if n_tokens == 0:
+        return np.zeros((0, n_labels))
+    alpha = np.zeros((n_tokens, n_labels))
+    beta = np.zeros((n_tokens, n_labels))
+    alpha[0] = emissions[0]
+    for t in range(1, n_tokens):
+        alpha[t] = _logsumexp(alpha[t - 1][:, None] + transitions, axis=0) + emissions[t]
+    for t in range(n_tokens - 2, -1, -1):
+        beta[t] = _logsumexp(transitions + (emissions[t + 1] + beta[t + 1])[None, :], axis=1)
+    log_z = _logsumexp(alpha[-1], axis=0)
+    return np.exp(alpha + beta - log_z)
+
+
+def nbest(emissions, transitions, n=5):
+    """Up to n best (label index path, score) pairs for one sentence, best first."""
+    n_tokens, n_labels = emissions.shape
+    if n_tokens == 0:
+        return [([], 0.0)]
+    # Top-n partial scores per ending label: (labels x n), padded with -inf
+    scores = np.full((n_labels, n), -np.inf)
+    scores[:, 0] = emissions[0]
+    backpointers = []
+    for t in range(1, n_tokens):
+        # Candidates for each next label, over (previous label, rank) pairs
+        candidates = (scores[:, :, None] + transitions[:, None, :]).reshape(n_labels * n, n_labels)
+        order = np.argsort(-candidates, axis=0, kind="stable")[:n]
+        scores = np.take_along_axis(candidates, order, axis=0).T + emissions[t][:, None]
+        backpointers.append(order.T)
+
+    flat = scores.ravel()
+    results = []
+    for index in np.argsort(-flat, kind="stable")[:n]:
+        if not np.isfinite(flat[index]):
+            break
+        label, rank = divmod(int(index), n)
+        path = [label]
+        for pointers in reversed(backpointers):
+            label, rank = divmod(int(pointers[label, rank]), n)
+            path.append(label)
+        results.append((path[::-1], float(flat[index])))
+    return results
+
+
+def path_score(emissions, transitions, path):
+    """Unnormalized score of a label index path."""
+    if not len(path):
+        return 0.0
+    path = np.asarray(path)
+    return float(emissions[np.arange(len(path)), path].sum() + transitions[path[:-1], path[1:]].sum())
@@ -1,89 +1,672 @@
 import subprocess
 import os
+import sys
+import glob
+import time
 import logging
 import json
+import atexit
+import asyncio
+import threading
+import collections
+import hashlib
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from src.caching import get_morphology_store, MORPH_SCHEMA_VERSION
+
+# Lines starting with this character are control messages of the JSON line
+# protocol (READY / PING / PONG / QUIT), never analysis requests.
+CONTROL_PREFIX = "\x01"
+
+# Result of a successful ping in either protocol
+PONG = "PONG"
+
+
+class NuveWorkerError(RuntimeError):
+    """Raised when the Nuve wrapper process dies, hangs or cannot be started."""
+
+
+def _read_str(buf, offset):
+    (length,) = struct.unpack_from("<H", buf, offset)
+    offset += 2
+    return buf[offset:offset + length].decode("utf-8"), offset + length
+
+
+class NuveWorker:
+    """
+    A long-lived Nuve wrapper process spoken to over stdin/stdout.
+
+    Every request gets exactly one response, in order, so responses are
+    matched to callers through a FIFO of futures filled by a reader thread.
+
+    protocol: "json"    - one JSON AnalysisResult line per word, all analyses
+              "compact" - length-prefixed binary frames carrying only the best
+                          analysis, with morphemes interned to integer indices
+    """
+
+    def __init__(self, command, protocol="json", startup_timeout=120.0, response_timeout=30.0):
+        self.command = command
+        self.protocol = protocol
+        self.startup_timeout = startup_timeout
+        self.response_timeout = response_timeout
+        self.process = None
+        self.startup_seconds = None
+        self._pending = collections.deque()
+        self._write_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._dead = False
+
+    def start(self):
+        started = time.perf_counter()
+        if self.protocol == "compact":
+            stream_args = {}
+        else:
+            stream_args = {"text": True, "encoding": "utf-8", "bufsize": 1}
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **stream_args
+            )
+        except OSError as e:
+            raise NuveWorkerError(f"Could not start Nuve wrapper: {e}") from e
+
+        reader = self._read_frames if self.protocol == "compact" else self._read_lines
+        threading.Thread(target=self._read_responses, args=(reader,), daemon=True).start()
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+
+        if not self._ready.wait(self.startup_timeout) or self._dead:
+            self.close()
+            raise NuveWorkerError("Nuve wrapper did not become ready")
+        self.startup_seconds = time.perf_counter() - started
+        logging.info(f"Nuve worker ready in {self.startup_seconds:.2f}s ({' '.join(self.command)})")
+        return self
+
+    def is_alive(self):
+        return not self._dead and self.process is not None and self.process.poll() is None
+
+    def _resolve(self, result):
+        try:
+            future = self._pending.popleft()
+        except IndexError:
+            logging.warning("Nuve wrapper sent an unexpected response")
+            return
+        future.set_result(result)
+
+    def _read_responses(self, reader):
+        """Runs a protocol reader; whatever ends it fails the requests still waiting."""
+        try:
+            reader()
+            error = NuveWorkerError("Nuve wrapper exited")
+        except Exception as e:
+            # Responses after a malformed one can no longer be matched to requests
+            logging.error(f"Nuve wrapper sent a malformed response: {e!r}")
+            error = NuveWorkerError(f"Malformed Nuve wrapper response: {e!r}")
+            self._dead = True
+            if self.process.poll() is None:
+                self.process.kill()
+        self._fail_pending(error)
+
+    def _read_lines(self):
+        for line in self.process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith(CONTROL_PREFIX):
+                message = line[1:]
+                if message == "READY":
+                    self._ready.set()
+                elif message == "PONG":
+                    self._resolve(PONG)
+            elif not self._ready.is_set():
+                # `dotnet run` may print build output before the wrapper starts
+                logging.debug(f"Nuve wrapper: {line}")
+            else:
+                self._resolve(line)
+
+    def _read_frames(self):
+        """
+        Decodes compact frames. Analyses resolve to (status, stem, morphemes)
+        where morphemes are (definition, has_change, surface) tuples and a
+        definition is (Id, LexicalForm, Type, labels), shared by every use.
+        """
+        stdout = self.process.stdout
+        definitions = {}
+        while True:
+            header = stdout.read(4)
+            if len(header) < 4:
+                break
+            (length,) = struct.unpack("<I", header)
+            payload = stdout.read(length)
+            if len(payload) < length:
+                break
+
+            kind = payload[:1]
+            if kind == b"A":
+                status = payload[1]
+                stem, offset = _read_str(payload, 2)
+                (count,) = struct.unpack_from("<H", payload, offset)
+                offset += 2
+                morphemes = []
+                for _ in range(count):
+                    index, has_change = struct.unpack_from("<IB", payload, offset)
+                    surface, offset = _read_str(payload, offset + 5)
+                    morphemes.append((definitions[index], bool(has_change), surface))
+                self._resolve((status, stem, morphemes))
+            elif kind == b"M":
+                (index,) = struct.unpack_from("<I", payload, 1)
+                m_id, offset = _read_str(payload, 5)
+                lexical_form, offset = _read_str(payload, offset)
+                m_type, offset = _read_str(payload, offset)
+                n_labels = payload[offset]
+                offset += 1
+                labels = []
+                for _ in range(n_labels):
+                    label, offset = _read_str(payload, offset)
+                    labels.append(label)
+                definitions[index] = (m_id, lexical_form, m_type, tuple(labels))
+            elif kind == b"O":
+                self._resolve(PONG)
+            elif kind == b"R":
+                self._ready.set()
+            else:
+                raise ValueError(f"unknown frame kind {kind!r}")
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", "replace")
+            logging.debug(f"Nuve wrapper stderr: {line.rstrip()}")
+
+    def _fail_pending(self, error):
+        self._dead = True
+        self._ready.set()
+        while True:
+            try:
+                future = self._pending.popleft()
+            except IndexError:
+                break
+            if not future.done():
+                future.set_exception(error)
+
+    def _encode(self, kind, text=""):
+        """Encodes one request: kind is "W" (word), "P" (ping) or "Q" (quit)."""
+        if self.protocol == "compact":
+            payload = kind.encode("ascii") + text.encode("utf-8")
+            return struct.pack("<I", len(payload)) + payload
+        if kind == "W":
+            return text + "\n"
+        return CONTROL_PREFIX + {"P": "PING", "Q": "QUIT"}[kind] + "\n"
+
+    def _send(self, requests):
+        futures = [Future() for _ in requests]
+        with self._write_lock:
+            if not self.is_alive():
+                raise NuveWorkerError("Nuve wrapper is not running")
+            # Queue the futures before writing so the reader never sees a
+            # response without its future.
+            self._pending.extend(futures)
+            try:
+                joiner = b"" if self.protocol == "compact" else ""
+                self.process.stdin.write(joiner.join(requests))
+                self.process.stdin.flush()
+            except (OSError, ValueError) as e:
+                self._fail_pending(NuveWorkerError(f"Nuve wrapper pipe closed: {e}"))
+        return futures
+
+    def _collect(self, futures):
+        try:
+            return [f.result(timeout=self.response_timeout) for f in futures]
+        except FutureTimeoutError:
+            self.close()
+            raise NuveWorkerError("Nuve wrapper timed out")
+
+    def submit(self, tokens):
+        """Sends tokens to the wrapper, returning one future per token."""
+        return self._send([self._encode("W", t) for t in tokens])
+
+    def iter_results(self, futures):
+        """
+        Yields the response of each future in order, as it arrives: a parsed
+        AnalysisResult dict (json) or a (status, stem, morphemes) tuple (compact).
+        """
+        for future in futures:
+            result = self._collect([future])[0]
+            yield json.loads(result) if self.protocol == "json" else result
+
+    def analyze(self, tokens):
+        """Returns the wrapper response for each token."""
+        return list(self.iter_results(self.submit(tokens)))
+
+    def ping(self):
+        """Round-trips a PING through the wrapper; False if it does not answer."""
+        try:
+            return self._collect(self._send([self._encode("P")])) == [PONG]
+        except NuveWorkerError:
+            return False
+
+    def close(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            try:
+                with self._write_lock:
+                    self.process.stdin.write(self._encode("Q"))
+                    self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self._fail_pending(NuveWorkerError("Nuve wrapper closed"))
+
 
 class NuveBridge:
     _instance = None
 
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(NuveBridge, cls).__new__(cls)
             cls._instance.initialized = False
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, workers=None, keep_full_analysis=None):
+        """
+        workers: number of wrapper processes used by pre_analyze
+                 (defaults to the number of CPU cores).
+        keep_full_analysis: keep every alternative analysis of a token under
+                 'full_analysis'. Off by default, which lets the wrapper use
+                 the compact protocol that only sends the best analysis.
+        """
         if self.initialized:
+            if workers:
+                self.workers = workers
+            if keep_full_analysis is not None and keep_full_analysis != self.keep_full_analysis:
+                self.keep_full_analysis = keep_full_analysis
+                # Running workers speak the other protocol
+                self.close()
             return
 
         self.nuve_path = "nuve_wrapper"
         self.initialized = True
         self.cache = {}
+        self.workers = workers or os.cpu_count() or 1
+        self.keep_full_analysis = bool(keep_full_analysis)
+        # Allomorph dicts are shared by every token that contains them
+        self._morphemes = {}
+        # token -> Future of its cache entry while a batch is analyzing it
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # Shards smaller than this are not worth starting another process for
+        self.min_shard_size = 512
+        # Slot 0 serves interactive calls, extra slots only sharded batches
+        self.pool = []
+        self._slot_locks = []
+        self.max_start_failures = 3
+        self.start_failures = 0
+        self.restarts = 0
+        self.build_attempted = False
+        self.startup_times = []
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.store = get_morphology_store()
+        self.engine_version = self._engine_version()
+        atexit.register(self.close)
+
+    def _engine_version(self):
+        """Identifies the wrapper build so persisted analyses are invalidated when it changes."""
+        digest = hashlib.sha1(f"schema{MORPH_SCHEMA_VERSION}".encode())
+        for name in ("Program.cs", "nuve_wrapper.csproj"):
+            path = os.path.join(self.nuve_path, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+        return f"wrapper-{digest.hexdigest()[:12]}"
+
+    @property
+    def worker(self):
+        return self.pool[0] if self.pool else None
 
-    def pre_analyze(self, tokens_list):
+    def _find_binary(self):
         """
-        Pre-fills the cache for all tokens in tokens_list in a single call.
+        Locates the compiled wrapper: NUVE_WRAPPER_BIN, else the newest
+        Release apphost or DLL under nuve_wrapper/bin.
+        Returns None when it is missing or older than its sources.
+        """
+        override = os.environ.get("NUVE_WRAPPER_BIN")
+        if override:
+            return override if os.path.exists(override) else None
+
+        apphost = "nuve_wrapper.exe" if sys.platform == "win32" else "nuve_wrapper"
+        candidates = []
+        for out_dir in sorted(glob.glob(os.path.join(self.nuve_path, "bin", "Release", "*"))):
+            for name in (apphost, "nuve_wrapper.dll"):
+                path = os.path.join(out_dir, name)
+                if os.path.isfile(path):
+                    candidates.append(path)
+                    break
+        if not candidates:
+            return None
+
+        binary = max(candidates, key=os.path.getmtime)
+        sources = [os.path.join(self.nuve_path, n) for n in ("Program.cs", "nuve_wrapper.csproj")]
+        if any(os.path.exists(p) and os.path.getmtime(p) > os.path.getmtime(binary) for p in sources):
+            logging.info(f"Nuve wrapper binary {binary} is older than its sources")
+            return None
+        return binary
+
+    def _build(self):
+        """Builds the wrapper in Release mode, at most once per process."""
+        # Pool slots starting in parallel wait for the one build
+        with self._build_lock:
+            if self.build_attempted:
+                return
+            self.build_attempted = True
+            logging.info("Building Nuve wrapper (dotnet build -c Release)...")
+            started = time.perf_counter()
+            try:
+                subprocess.run(
+                    ["dotnet", "build", self.nuve_path, "-c", "Release"],
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, check=True
+                )
+                logging.info(f"Nuve wrapper built in {time.perf_counter() - started:.1f}s")
+            except (OSError, subprocess.CalledProcessError) as e:
+                output = getattr(e, "stdout", "") or ""
+                logging.error(f"Nuve wrapper build failed: {e}\n{output[-2000:]}")
+
+    def _command(self):
+        """Execs the prebuilt wrapper; `dotnet run` is only a last resort."""
+        binary = self._find_binary()
+        if binary is None:
+            self._build()
+            binary = self._find_binary()
+        if binary is None:
+            return ["dotnet", "run", "--project", self.nuve_path]
+        if binary.endswith(".dll"):
+            return ["dotnet", binary]
+        return [binary]
+
+    def _launch(self):
+        """Returns the worker command and the protocol it speaks."""
+        command = self._command()
+        if self.keep_full_analysis:
+            return command, "json"
+        if command[:2] == ["dotnet", "run"]:
+            # Build output on stdout would corrupt binary frames
+            return command, "json"
+        return command + ["--compact"], "compact"
+
+    def _get_worker(self, slot=0):
+        """Returns the running worker of a slot, (re)starting it if it is missing or has crashed."""
+        with self._lock:
+            while len(self.pool) <= slot:
+                self.pool.append(None)
+                self._slot_locks.append(threading.Lock())
+            slot_lock = self._slot_locks[slot]
+
+        # Slots start independently so a pool comes up in parallel
+        with slot_lock:
+            worker = self.pool[slot]
+            if worker is not None and worker.is_alive():
+                return worker
+
+            if self.start_failures >= self.max_start_failures:
+                raise NuveWorkerError("Nuve wrapper failed to start too many times, giving up")
+
+            if worker is not None:
+                self.restarts += 1
+                logging.warning(f"Nuve worker {slot} died, restarting (restart #{self.restarts})")
+                worker.close()
+
+            try:
+                command, protocol = self._launch()
+                worker = NuveWorker(command, protocol=protocol).start()
+            except NuveWorkerError:
+                self.pool[slot] = None
+                self.start_failures += 1
+                raise
+            self.start_failures = 0
+            self.startup_times.append(worker.startup_seconds)
+            self.pool[slot] = worker
+            return worker
+
+    def health_check(self):
+        """
+        Pings the worker, restarting it once if it does not answer.
+        Returns True when a responsive worker is available.
+        """
+        try:
+            worker = self._get_worker()
+            if worker.ping():
+                return True
+            worker.close()
+            return self._get_worker().ping()
+        except NuveWorkerError as e:
+            logging.error(f"NuveBridge health check failed: {e}")
+            return False
+
+    def _close_slots(self, first_slot):
+        with self._lock:
+            workers = self.pool[first_slot:]
+            self.pool[first_slot:] = [None] * len(workers)
+        for worker in workers:
+            if worker is not None:
+                worker.close()
+
+    def close(self):
+        """Shuts all workers down; they are started again on the next analysis."""
+        self._close_slots(0)
+
+    def pre_analyze(self, tokens_list, workers=None):
+        """
+        Pre-fills the cache for all tokens in tokens_list.
+        Unique tokens are sharded across up to `workers` wrapper processes.
         """
         unique_tokens = list(set(tokens_list))
-        logging.info(f"Nuve Pre-analyzing {len(unique_tokens)} unique tokens...")
+        self._load_from_store(unique_tokens)
+        to_analyze = self._filter_uncached(unique_tokens)
+
+        workers = workers or self.workers
+        n_shards = max(1, min(workers, len(to_analyze) // self.min_shard_size))
+        logging.info(f"Nuve Pre-analyzing {len(unique_tokens)} unique tokens "
+                     f"({len(to_analyze)} uncached) on {n_shards} worker(s)...")
+
+        if n_shards == 1:
+            return self.analyze_batch(unique_tokens)
+
+        # Round-robin keeps shards balanced; each thread drives its own process
+        shards = [to_analyze[i::n_shards] for i in range(n_shards)]
+        try:
+            with ThreadPoolExecutor(max_workers=n_shards) as executor:
+                list(executor.map(self._analyze_on, range(n_shards), shards))
+        finally:
+            # Extra processes only serve bulk pre-analysis
+            self._close_slots(1)
+            if self.store is not None:
+                self.store.flush()
+
         return self.analyze_batch(unique_tokens)
 
-    def analyze_batch(self, tokens):
+    def _intern_morpheme(self, definition, has_change, surface):
         """
-        Analyzes a large list of tokens in one subprocess call.
+        Returns the shared morpheme dict for an allomorph.
+        definition is (Id, LexicalForm, Type, labels). Callers must not mutate the result.
         """
-        # Filter tokens not in cache
-        to_analyze = [t for t in tokens if t not in self.cache]
+        key = (definition, has_change, surface)
+        morpheme = self._morphemes.get(key)
+        if morpheme is None:
+            m_id, lexical_form, m_type, labels = definition
+            morpheme = self._morphemes.setdefault(key, {
+                "Surface": surface,
+                "LexicalForm": lexical_form,
+                "Id": m_id,
+                "Type": m_type,
+                "Labels": list(labels),
+                "HasChange": has_change
+            })
+        return morpheme
 
-        if not to_analyze:
-            return {t: self.cache[t] for t in tokens}
+    def _intern_morpheme_dict(self, m):
+        definition = (m.get("Id"), m.get("LexicalForm"), m.get("Type"), tuple(m.get("Labels") or ()))
+        return self._intern_morpheme(definition, m.get("HasChange", False), m.get("Surface"))
 
-        try:
-            process = subprocess.Popen(
-                ["dotnet", "run", "--project", self.nuve_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+    def _to_entry(self, token, result):
+        if isinstance(result, tuple):
+            # Compact protocol: (status, stem, morphemes)
+            status, stem, morphemes = result
+            if status != 0:
+                return {"lemma": token, "morphemes": [], "is_unknown": True}
+            return {
+                "lemma": stem,
+                "morphemes": [self._intern_morpheme(*m) for m in morphemes]
+            }
+
+        analyses = result.get("Analyses", [])
+        if analyses:
+            # Store first analysis (highest probability usually in Nuve)
+            best = analyses[0]
+            entry = {
+                "lemma": best.get("Stem"),
+                "morphemes": [self._intern_morpheme_dict(m) for m in best.get("Morphemes", [])]
+            }
+            if self.keep_full_analysis:
+                entry["full_analysis"] = result
+            return entry
+        return {"lemma": token, "morphemes": [], "is_unknown": True}
+
+    @property
+    def _store_engine(self):
+        return "nuve-full" if self.keep_full_analysis else "nuve"
+
+    def _load_from_store(self, tokens):
+        """Fills the in-memory cache from the persistent store."""
+        if self.store is None:
+            return
+        missing = [t for t in tokens if t not in self.cache]
+        if not missing:
+            return
+        for token, entry in self.store.get_many(self._store_engine, self.engine_version, missing).items():
+            entry["morphemes"] = [self._intern_morpheme_dict(m) for m in entry.get("morphemes", [])]
+            self.cache[token] = entry
+
+    def _filter_uncached(self, tokens):
+        # Blank tokens or tokens containing line breaks cannot be framed as a
+        # single request line; they fall back to UNK.
+        return list(dict.fromkeys(
+            t for t in tokens
+            if t not in self.cache and t.strip() and "\n" not in t and "\r" not in t
+            and not t.startswith(CONTROL_PREFIX)
+        ))
+
+    def _analyze_on(self, slot, to_analyze, max_crashes=5):
+        """Analyzes tokens on one worker slot and merges the results into the cache."""
+        pending = [t for t in to_analyze if t not in self.cache]
+        crashes = 0
+        isolate = False
+        while pending and crashes < max_crashes:
+            try:
+                worker = self._get_worker(slot)
+            except NuveWorkerError as e:
+                logging.error(f"NuveBridge Error: {e}")
+                return
+
+            batch = pending[:1] if isolate else pending
+            analyzed = {}
+            try:
+                for token, result in zip(batch, worker.iter_results(worker.submit(batch))):
+                    analyzed[token] = self._to_entry(token, result)
+                pending = pending[len(batch):]
+                isolate = False
+            except (NuveWorkerError, ValueError) as e:
+                logging.error(f"NuveBridge Error: {e}")
+                worker.close()
+                crashes += 1
+                pending = pending[len(analyzed):]
+                # Responses arrive in order, so the first unanswered token is
+                # the likely culprit. Other batches sharing the worker fail
+                # with it, so it is retried alone and only skipped if it
+                # fails again. A skipped token is cached as unknown so that no
+                # later pass sends it (and crashes a worker) again; it is not
+                # persisted, in case the failure was transient.
+                if isolate:
+                    self.cache[pending[0]] = self._unknown_entry(pending[0])
+                    pending = pending[1:]
+                isolate = not isolate
+
+            self.cache.update(analyzed)
+            if self.store is not None and analyzed:
+                self.store.put_many(self._store_engine, self.engine_version, analyzed)
 
-            input_text = "\n".join(to_analyze) + "\n"
-            stdout, stderr = process.communicate(input=input_text)
+    @staticmethod
+    def _unknown_entry(token):
+        return {"lemma": token, "morphemes": [], "pos": "UNK"}
 
-            for line in stdout.splitlines():
-                if not line.strip():
+    def _claim(self, tokens):
+        """
+        Coalesces concurrent requests: returns the tokens this caller has to
+        analyze itself, and a future for every uncached token, including
+        those another batch is already analyzing.
+        """
+        claimed, futures = [], {}
+        with self._inflight_lock:
+            for t in tokens:
+                if t in self.cache:
                     continue
-                try:
-                    res_json = json.loads(line)
-                    word = res_json.get("Word")
-                    analyses = res_json.get("Analyses", [])
-
-                    if word and analyses:
-                        # Store first analysis (highest probability usually in Nuve)
-                        best = analyses[0]
-                        self.cache[word] = {
-                            "lemma": best.get("Stem"),
-                            "morphemes": best.get("Morphemes", []),
-                            "full_analysis": res_json
-                        }
-                    elif word:
-                        self.cache[word] = {"lemma": word, "morphemes": [], "is_unknown": True}
-                except json.JSONDecodeError:
-                    pass
-
-            # Fallback for failed ones
-            for t in to_analyze:
-                if t not in self.cache:
-                    self.cache[t] = {"lemma": t, "morphemes": [], "pos": "UNK"}
+                future = self._inflight.get(t)
+                if future is None:
+                    future = self._inflight[t] = Future()
+                    claimed.append(t)
+                futures[t] = future
+        return claimed, futures
 
-        except Exception as e:
-            logging.error(f"NuveBridge Error: {e}")
-            for t in to_analyze:
-                if t not in self.cache:
-                    self.cache[t] = {"lemma": t, "morphemes": [], "pos": "UNK"}
+    def _run_claimed(self, claimed):
+        try:
+            self._analyze_on(0, claimed)
+        finally:
+            with self._inflight_lock:
+                for t in claimed:
+                    if t not in self.cache:
+                        self.cache[t] = self._unknown_entry(t)
+                    future = self._inflight.pop(t)
+                    if not future.done():
+                        future.set_result(self.cache[t])
+
+    def _finish_batch(self, tokens):
+        # Fallback for failed ones
+        for t in tokens:
+            if t not in self.cache:
+                self.cache[t] = self._unknown_entry(t)
 
         return {t: self.cache[t] for t in tokens}
 
+    def analyze_batch(self, tokens):
+        """
+        Analyzes a list of tokens through the persistent wrapper process.
+        Tokens another thread is already analyzing are waited for, not re-sent.
+        """
+        self._load_from_store(tokens)
+        claimed, futures = self._claim(self._filter_uncached(tokens))
+        if claimed:
+            self._run_claimed(claimed)
+        for future in futures.values():
+            future.result()
+        return self._finish_batch(tokens)
+
+    async def aanalyze_batch(self, tokens):
+        """
+        Asyncio counterpart of analyze_batch. Concurrent calls are multiplexed
+        onto the worker pipe, and identical in-flight tokens are analyzed once.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._load_from_store, tokens)
+        claimed, futures = self._claim(self._filter_uncached(tokens))
+        # Other callers wait on the same futures: cancelling this call (e.g. by
+        # wait_for) must neither cancel them nor drop the analysis it claimed
+        if claimed:
+            await asyncio.shield(loop.run_in_executor(None, self._run_claimed, claimed))
+        if futures:
+            await asyncio.gather(*(asyncio.shield(asyncio.wrap_future(f)) for f in futures.values()))
+        return self._finish_batch(tokens)
+
     def analyze(self, token):
         if token in self.cache:
             return self.cache[token]
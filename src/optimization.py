@@ -28,13 +28,11 @@ def run_grid_search(output_dir="results/optimization"):
 
     def prepare_features(dataset):
         X, y = [], []
-        for item in dataset:
-            tokens = item['tokens']
-            tags = item['tags']
-            processed_tokens = prep.process_sentence(tokens)
+        processed_corpus = prep.process_corpus(item['tokens'] for item in dataset)
+        for item, processed_tokens in zip(dataset, processed_corpus):
             feats = extractor.sent2features(processed_tokens)
             X.append(feats)
-            y.append(tags)
+            y.append(item['tags'])
         return X, y
 
     logging.info("Extracting features...")
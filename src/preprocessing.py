@@ -1,33 +1,49 @@
 import os
 import logging
 import re
-from datasets import load_dataset
+import importlib.util
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from src.caching import LRUCache, get_morphology_store, MORPH_SCHEMA_VERSION
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Try to import Zemberek, fall back to regex-based analysis if unavailable
-try:
-    from zemberek import TurkishMorphology
-    ZEMBEREK_AVAILABLE = True
-except ImportError:
-    ZEMBEREK_AVAILABLE = False
+# Zemberek is only imported when a Zemberek engine is created; fall back to
+# regex-based analysis if it is not installed
+ZEMBEREK_AVAILABLE = importlib.util.find_spec("zemberek") is not None
+if ZEMBEREK_AVAILABLE:
+    try:
+        from importlib.metadata import version as _package_version
+        ZEMBEREK_VERSION = f"zemberek-python-{_package_version('zemberek-python')}-schema{MORPH_SCHEMA_VERSION}-stablepick"
+    except Exception:
+        ZEMBEREK_VERSION = f"zemberek-python-unknown-schema{MORPH_SCHEMA_VERSION}-stablepick"
+else:
+    ZEMBEREK_VERSION = None
     logging.warning("Zemberek not available, using regex-based morphological analysis")
 
 
 class Preprocessor:
-    def __init__(self, engine="zemberek"):
+    def __init__(self, engine="zemberek", cache_size=100000):
         """
         engine: "zemberek" (default) or "nuve"
+        cache_size: number of Zemberek analyses kept in memory (0 disables)
         """
         self.engine = engine
         self.morphology = None
         self.nuve = None
+        self.store = get_morphology_store()
+        self.zemberek_version = ZEMBEREK_VERSION
+        self.cache = LRUCache(cache_size)
+        self.zemberek_calls = 0
+        self._executor = None
 
         if self.engine == "zemberek":
             if ZEMBEREK_AVAILABLE:
                 logging.info("Initializing Zemberek Morphology...")
                 try:
+                    from zemberek import TurkishMorphology
                     self.morphology = TurkishMorphology.create_with_defaults()
                     logging.info("Zemberek initialized.")
                 except Exception as e:
@@ -44,6 +60,7 @@ class Preprocessor:
             if ZEMBEREK_AVAILABLE:
                 logging.info("Initializing Zemberek (Hybrid)...")
                 try:
+                    from zemberek import TurkishMorphology
                     self.morphology = TurkishMorphology.create_with_defaults()
                 except Exception as e:
                     logging.warning(f"Zemberek init failed: {e}")
@@ -60,6 +77,7 @@ class Preprocessor:
         """
         logging.info(f"Loading WikiANN (tr) split: {split}")
         try:
+            from datasets import load_dataset
             dataset = load_dataset("wikiann", "tr", split=split)
             if limit:
                 dataset = dataset.select(range(limit))
@@ -74,6 +92,7 @@ class Preprocessor:
         """
         logging.info(f"Loading Turkish WikiNER split: {split}")
         try:
+            from datasets import load_dataset
             dataset = load_dataset("turkish-nlp-suite/turkish-wikiNER", split=split)
             if limit:
                 dataset = dataset.select(range(limit))
@@ -119,37 +138,100 @@ class Preprocessor:
 
         return lemma if lemma else word, pos
 
+    def _zemberek_analyze(self, word):
+        """
+        Runs Zemberek on a single word.
+        Returns: lemma, pos, morphemes (list of dicts)
+        """
+        results = self.morphology.analyze(word)
+        if not results.analysis_results:
+            return word, "UNK", []
+
+        # Candidate order depends on the interpreter's hash seed; pick a stable
+        # one so every process (and every run) agrees on the analysis
+        best = min(results.analysis_results, key=str)
+        lemma = best.get_stem()
+        pos = best.item.primary_pos.value if hasattr(best.item, 'primary_pos') else "UNK"
+
+        # Extract rich morph info
+        morphemes = []
+        for md in best.morpheme_data_list:
+            m_id = md.morpheme.id_
+            morphemes.append({
+                "Id": m_id,
+                "Surface": md.surface,
+                "HasChange": len(md.surface) > 0 and md.surface != md.morpheme.id_, # Simple heuristic
+                "Type": "Root" if md == best.morpheme_data_list[0] else "Suffix",
+                "Labels": [] # Zemberek doesn't expose labels the same way as Nuve
+            })
+
+        return lemma, pos, morphemes
+
+    def _analyze_zemberek_batch(self, tokens, workers=1, chunk_size=2000):
+        """
+        Analyzes the unique tokens with Zemberek. Lookups go through the
+        in-memory LRU, then the persistent morphology store, then Zemberek.
+        Returns: {token: (lemma, pos, morphemes)}; cached values are shared, do not mutate.
+        """
+        unique_tokens = list(dict.fromkeys(tokens))
+        results = self.cache.get_many(unique_tokens)
+        missing = [t for t in unique_tokens if t not in results]
+
+        from_store = {}
+        if self.store is not None and missing:
+            for token, (lemma, pos, morph) in self.store.get_many(
+                    "zemberek", self.zemberek_version, missing).items():
+                from_store[token] = (lemma, pos, morph)
+        results.update(from_store)
+
+        missing = [t for t in missing if t not in from_store]
+        self.zemberek_calls += len(missing)
+        if workers > 1 and len(missing) > chunk_size:
+            analyzed, fallbacks = self._analyze_zemberek_parallel(missing, workers, chunk_size)
+        else:
+            analyzed, fallbacks = _zemberek_analyze_tokens(self, missing)
+        # Regex fallbacks are not engine output, so they are not cached
+        results.update(fallbacks)
+        results.update(analyzed)
+        if self.store is not None and analyzed:
+            self.store.put_many("zemberek", self.zemberek_version, analyzed)
+        self.cache.put_many({**from_store, **analyzed})
+        return results
+
+    def _analyze_zemberek_parallel(self, tokens, workers, chunk_size):
+        """Runs Zemberek over chunks of tokens in a pool of worker processes."""
+        chunks = [tokens[i:i + chunk_size] for i in range(0, len(tokens), chunk_size)]
+        workers = min(workers, len(chunks))
+        logging.info(f"Zemberek analyzing {len(tokens)} tokens on {workers} processes...")
+        analyzed, fallbacks = {}, {}
+        # Spawned workers each load their own Zemberek instance
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_corpus_worker) as executor:
+            for chunk_analyzed, chunk_fallbacks in executor.map(_analyze_corpus_chunk, chunks):
+                analyzed.update(chunk_analyzed)
+                fallbacks.update(chunk_fallbacks)
+        return analyzed, fallbacks
+
+    def analyze_words(self, tokens):
+        """
+        Batch counterpart of analyze_word; each unique token is analyzed once.
+        Returns: {token: (lemma, pos, morph)}
+        """
+        return self._word_results(tokens)
+
+    def cache_info(self):
+        """In-memory cache statistics and the number of actual Zemberek calls."""
+        return {**self.cache.info(), "zemberek_calls": self.zemberek_calls}
+
     def analyze_word(self, word):
         """
         Analyzes a word using Zemberek, Nuve, or regex fallback.
         Returns: lemma, pos, morph_info (dict)
         """
+        # Hybrid rows take their zemberek_* fields from the regex fallback: the
+        # published Hybrid_Nuve_Zemberek results were produced that way
         if self.engine == "zemberek" and self.morphology:
-            try:
-                results = self.morphology.analyze(word)
-                if results.analysis_results:
-                    best = results.analysis_results[0]
-                    lemma = best.get_stem()
-                    pos = best.item.primary_pos.value if hasattr(best.item, 'primary_pos') else "UNK"
-
-                    # Extract rich morph info
-                    morphemes = []
-                    for md in best.morpheme_data_list:
-                        m_id = md.morpheme.id_
-                        morphemes.append({
-                            "Id": m_id,
-                            "Surface": md.surface,
-                            "HasChange": len(md.surface) > 0 and md.surface != md.morpheme.id_, # Simple heuristic
-                            "Type": "Root" if md == best.morpheme_data_list[0] else "Suffix",
-                            "Labels": [] # Zemberek doesn't expose labels the same way as Nuve
-                        })
-
-                    return lemma, pos, morphemes
-                else:
-                    return word, "UNK", []
-            except Exception:
-                l, p = self._regex_analyze(word)
-                return l, p, []
+            return self._analyze_zemberek_batch([word])[word]
         elif self.engine == "nuve" and self.nuve:
             analysis = self.nuve.analyze(word)
             return analysis['lemma'], "UNK", analysis.get('morphemes', [])
@@ -157,6 +239,61 @@ class Preprocessor:
             l, p = self._regex_analyze(word)
             return l, p, {}
 
+    def _word_results(self, tokens, workers=1, chunk_size=2000):
+        """
+        Word-level analyses (Zemberek, or the regex fallback) of each unique token.
+        Returns: {token: (lemma, pos, morph)}
+        """
+        if self.engine == "zemberek" and self.morphology:
+            return self._analyze_zemberek_batch(tokens, workers, chunk_size)
+        return {t: self.analyze_word(t) for t in dict.fromkeys(tokens)}
+
+    def _morph_rows(self, tokens, word_results):
+        processed = []
+        for token in tokens:
+            lemma, pos, morph = word_results[token]
+            processed.append({
+                'word': token,
+                'lemma': lemma,
+                'pos': pos,
+                'morph': morph
+            })
+        return processed
+
+    def _nuve_rows(self, tokens, nuve_results):
+        processed = []
+        for token in tokens:
+            res = nuve_results.get(token, {'lemma': token, 'morphemes': []})
+            processed.append({
+                'word': token,
+                'lemma': res['lemma'],
+                'pos': "UNK",
+                'morph': res.get('morphemes', [])
+            })
+        return processed
+
+    def _hybrid_rows(self, tokens, nuve_results, word_results):
+        processed = []
+        for token in tokens:
+            z_lemma, z_pos, z_morph = word_results[token]
+            n_res = nuve_results.get(token, {'lemma': token, 'morphemes': []})
+
+            processed.append({
+                'word': token,
+                'lemma': n_res['lemma'], # Default to Nuve lemma as primary
+                'pos': z_pos,            # Default to Zemberek POS as primary
+                'morph': n_res.get('morphemes', []), # Default morph
+
+                # Store Both explicitly
+                'nuve_lemma': n_res['lemma'],
+                'nuve_morph': n_res.get('morphemes', []),
+
+                'zemberek_lemma': z_lemma,
+                'zemberek_pos': z_pos,
+                'zemberek_morph': z_morph
+            })
+        return processed
+
     def process_sentence(self, tokens):
         """
         Analyzes a list of tokens.
@@ -164,58 +301,99 @@ class Preprocessor:
         """
         if self.engine == "nuve" and self.nuve:
             # Batch process tokens for speed
-            nuve_results = self.nuve.analyze_batch(tokens)
-            processed = []
-            for token in tokens:
-                res = nuve_results.get(token, {'lemma': token, 'morphemes': []})
-                processed.append({
-                    'word': token,
-                    'lemma': res['lemma'],
-                    'pos': "UNK",
-                    'morph': res.get('morphemes', [])
-                })
-            return processed
+            return self._nuve_rows(tokens, self.nuve.analyze_batch(tokens))
 
         if self.engine == "hybrid":
-            # 1. Get Nuve Results (Batch)
+            # Word-level analysis runs in a worker thread while Nuve waits on its pipe
+            z_future = self._word_executor().submit(self._word_results, tokens)
             nuve_results = {}
             if self.nuve:
                 nuve_results = self.nuve.analyze_batch(tokens)
+            return self._hybrid_rows(tokens, nuve_results, z_future.result())
 
-            processed = []
-            for token in tokens:
-                # 2. Get Zemberek Results (Word-by-word)
-                z_lemma, z_pos, z_morph = self.analyze_word(token) # analyze_word uses self.morphology if set
+        return self._morph_rows(tokens, self._word_results(tokens))
 
-                # 3. Get Nuve Result
-                n_res = nuve_results.get(token, {'lemma': token, 'morphemes': []})
+    def process_corpus(self, sentences, workers=None, chunk_size=2000):
+        """
+        Preprocesses a whole corpus. Tokens are deduplicated across sentences and
+        each unique token is analyzed once, spread over `workers` processes
+        (Zemberek process pool, Nuve wrapper pool).
+        sentences: iterable of token lists
+        Yields the processed sentences in input order.
+        """
+        sentences = [list(tokens) for tokens in sentences]
+        workers = workers or os.cpu_count() or 1
+        unique_tokens = list(dict.fromkeys(t for tokens in sentences for t in tokens))
+        logging.info(f"Preprocessing {len(sentences)} sentences "
+                     f"({len(unique_tokens)} unique tokens) with {workers} workers...")
 
-                processed.append({
-                    'word': token,
-                    'lemma': n_res['lemma'], # Default to Nuve lemma as primary
-                    'pos': z_pos,            # Default to Zemberek POS as primary
-                    'morph': n_res.get('morphemes', []), # Default morph
+        # Word-level analysis runs alongside Nuve in hybrid mode
+        z_future = None
+        if self.engine != "nuve":
+            z_future = self._word_executor().submit(self._word_results, unique_tokens, workers, chunk_size)
+        if self.nuve:
+            self.nuve.pre_analyze(unique_tokens, workers=workers)
+        word_results = z_future.result() if z_future else None
 
-                    # Store Both explicitly
-                    'nuve_lemma': n_res['lemma'],
-                    'nuve_morph': n_res.get('morphemes', []),
+        for tokens in sentences:
+            if self.engine == "nuve" and self.nuve:
+                yield self._nuve_rows(tokens, self.nuve.analyze_batch(tokens))
+            elif self.engine == "hybrid":
+                nuve_results = self.nuve.analyze_batch(tokens) if self.nuve else {}
+                yield self._hybrid_rows(tokens, nuve_results, word_results)
+            else:
+                yield self._morph_rows(tokens, word_results)
 
-                    'zemberek_lemma': z_lemma,
-                    'zemberek_pos': z_pos,
-                    'zemberek_morph': z_morph
-                })
-            return processed
+    def _word_executor(self):
+        # A single thread keeps Zemberek calls serialized
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zemberek")
+        return self._executor
 
-        processed = []
-        for token in tokens:
-            lemma, pos, morph = self.analyze_word(token)
-            processed.append({
-                'word': token,
-                'lemma': lemma,
-                'pos': pos,
-                'morph': morph
-            })
-        return processed
+    async def aprocess_sentence(self, tokens):
+        """
+        Asyncio counterpart of process_sentence. Nuve requests are multiplexed
+        onto the shared wrapper; Zemberek runs off the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self.engine == "nuve" and self.nuve:
+            return self._nuve_rows(tokens, await self.nuve.aanalyze_batch(tokens))
+
+        word_results = loop.run_in_executor(self._word_executor(), self._word_results, tokens)
+        if self.engine == "hybrid":
+            if self.nuve:
+                nuve_results, z_results = await asyncio.gather(self.nuve.aanalyze_batch(tokens), word_results)
+            else:
+                nuve_results, z_results = {}, await word_results
+            return self._hybrid_rows(tokens, nuve_results, z_results)
+
+        return self._morph_rows(tokens, await word_results)
+
+
+def _zemberek_analyze_tokens(prep, tokens):
+    """Returns ({token: analysis}, {token: regex fallback}) for tokens Zemberek could not analyze."""
+    analyzed, fallbacks = {}, {}
+    for token in tokens:
+        try:
+            analyzed[token] = prep._zemberek_analyze(token)
+        except Exception:
+            l, p = prep._regex_analyze(token)
+            fallbacks[token] = (l, p, [])
+    return analyzed, fallbacks
+
+
+_corpus_worker = None
+
+
+def _init_corpus_worker():
+    global _corpus_worker
+    # The parent process owns the caches; workers only run Zemberek
+    os.environ["NEREXT_MORPH_CACHE"] = "off"
+    _corpus_worker = Preprocessor(engine="zemberek", cache_size=0)
+
+
+def _analyze_corpus_chunk(tokens):
+    return _zemberek_analyze_tokens(_corpus_worker, tokens)
 
 
 if __name__ == "__main__":
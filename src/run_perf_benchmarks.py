@@ -0,0 +1,432 @@
+"""
+Performance benchmarks for the NER pipeline.
+
+Usage: python -m src.run_perf_benchmarks <benchmark> [options]
+Each benchmark prints a summary and writes results/benchmarks/perf_<benchmark>.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+OUTPUT_DIR = "results/benchmarks"
+# Morphology engine of the models written by src/train_for_demo.py
+DEMO_ENGINE = "nuve"
+
+
+def save_result(name, result):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    result = {"benchmark": name, "timestamp": datetime.now().isoformat(), **result}
+    out_path = os.path.join(OUTPUT_DIR, f"perf_{name}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4, ensure_ascii=False)
+    logging.info(f"Result saved to {out_path}")
+    return result
+
+
+def bench_nuve_startup(args):
+    """Cold start of the Nuve wrapper: `dotnet run` versus the prebuilt binary."""
+    from src.nuve_bridge import NuveBridge, NuveWorker, NuveWorkerError
+
+    bridge = NuveBridge()
+    dotnet_run = ["dotnet", "run", "--project", bridge.nuve_path]
+    launchers = {"dotnet_run": dotnet_run}
+    prebuilt = bridge._command()
+    if prebuilt != dotnet_run:
+        launchers["prebuilt"] = prebuilt
+    else:
+        logging.warning("No prebuilt Nuve wrapper found, only `dotnet run` is measured")
+
+    results = {}
+    for name, command in launchers.items():
+        ready, first_token = [], []
+        for _ in range(args.repeats):
+            worker = NuveWorker(command)
+            try:
+                worker.start()
+                started = time.perf_counter()
+                worker.analyze(["kitaplar"])
+                first_token.append(time.perf_counter() - started)
+                ready.append(worker.startup_seconds)
+            except NuveWorkerError as e:
+                logging.error(f"{name}: {e}")
+                break
+            finally:
+                worker.close()
+        if ready:
+            results[name] = {
+                "command": command,
+                "ready_seconds_median": statistics.median(ready),
+                "ready_seconds": ready,
+                "first_token_seconds_median": statistics.median(first_token),
+            }
+            print(f"{name:<12} ready in {statistics.median(ready):.3f}s, "
+                  f"first token {statistics.median(first_token) * 1000:.1f}ms")
+
+    return save_result("nuve_startup", {"repeats": args.repeats, "launchers": results})
+
+
+IMPORT_TARGETS = {
+    "preprocessing": "from src.preprocessing import Preprocessor",
+    "features": "from src.features import FeatureExtractor",
+    "crf_model": "from src.models.crf_model import CRFModel",
+    # Python side of the Demo inference path
+    "demo_inference": "from src.models.crf_model import CRFModel; "
+                      "from src.features import FeatureExtractor; "
+                      "from src.preprocessing import Preprocessor",
+    # Heavy dependencies that should not be on the path above
+    "datasets": "import datasets",
+    "zemberek": "import zemberek",
+}
+
+
+def _time_import(statement):
+    code = ("import time; t = time.perf_counter(); "
+            f"{statement}; print(time.perf_counter() - t)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def bench_import_time(args):
+    """Cold import time of the pipeline modules, each in a fresh interpreter."""
+    results = {}
+    for name, statement in IMPORT_TARGETS.items():
+        try:
+            timings = [_time_import(statement) for _ in range(args.repeats)]
+        except subprocess.CalledProcessError as e:
+            logging.warning(f"{name}: import failed ({e.stderr.strip().splitlines()[-1]})")
+            continue
+        results[name] = {
+            "statement": statement,
+            "seconds_median": statistics.median(timings),
+            "seconds": timings,
+        }
+        print(f"{name:<16} {statistics.median(timings) * 1000:8.1f}ms")
+
+    return save_result("import_time", {"repeats": args.repeats, "imports": results})
+
+
+def _gold_sentences(engine, limit=None):
+    from src.experiments_runner import load_json_data
+    from src.preprocessing import Preprocessor
+
+    data = load_json_data("gold_extended_final.json")[:limit]
+    prep = Preprocessor(engine=engine)
+    return list(prep.process_corpus(item['tokens'] for item in data))
+
+
+def _model_extractor(args):
+    """
+    Extractor and morphology engine a CRF model was trained with: the feature config
+    from --config and the engine from --engine, else from the experiment result
+    given as --config, else DEMO_ENGINE. Features from another engine give the
+    model morphology attributes it has never seen.
+    """
+    from src.features import FeatureExtractor
+    from src.models.compact_crf import load_feature_config
+
+    if args.engine is None:
+        args.engine = DEMO_ENGINE
+        if os.path.exists(args.config):
+            with open(args.config, encoding="utf-8") as f:
+                args.engine = json.load(f)["config"].get("engine", DEMO_ENGINE)
+    return FeatureExtractor.from_config(load_feature_config(args.config), model_path=args.model)
+
+
+def bench_features(args):
+    """Feature extraction throughput: per-token word2features versus sentence-level sent2features."""
+    from src.features import FeatureExtractor
+
+    sentences = _gold_sentences(args.engine, args.limit)
+    n_tokens = sum(len(s) for s in sentences)
+    extractor = FeatureExtractor(use_gazetteers=True, use_morphology=True)
+    extractor.sent2features(sentences[0])
+
+    def per_token(sent):
+        span_features = extractor.gazetteer_span_features(sent)
+        return [extractor.word2features(sent, i, span_features[i]) for i in range(len(sent))]
+
+    results = {}
+    for name, extract in [("per_token", per_token), ("sentence", extractor.sent2features)]:
+        timings = []
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            for sent in sentences:
+                extract(sent)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results[name] = {"seconds": timings, "tokens_per_second": n_tokens / best}
+        print(f"{name:<10} {n_tokens / best:10.0f} tokens/s")
+
+    # Token feature memo: cold-run speed and hit rate against the memory it retains
+    # next to an encoded corpus (the form training data is held in)
+    import tracemalloc
+    from src.feature_encoding import FeatureEncoder
+
+    memo = {}
+    for size in args.memo_sizes:
+        memo_extractor = FeatureExtractor(use_gazetteers=True, use_morphology=True, feature_cache_size=size)
+        started = time.perf_counter()
+        list(memo_extractor.corpus2features(sentences))
+        seconds = time.perf_counter() - started
+        info = memo_extractor.feature_cache_info()
+
+        memo_extractor = FeatureExtractor(use_gazetteers=True, use_morphology=True, feature_cache_size=size)
+        tracemalloc.start()
+        encoded = FeatureEncoder().encode(memo_extractor.corpus2features(sentences))
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memo[size] = {
+            "tokens_per_second": n_tokens / seconds,
+            "hit_rate": info["hits"] / max(info["hits"] + info["misses"], 1),
+            "retained_mb": retained / 2 ** 20,
+            "peak_mb": peak / 2 ** 20,
+            "encoded_mb": encoded.nbytes / 2 ** 20,
+        }
+        print(f"memo {size:>6} {n_tokens / seconds:10.0f} tokens/s hit rate {memo[size]['hit_rate']:.2f} "
+              f"retained {memo[size]['retained_mb']:.1f}MB (encoded corpus {memo[size]['encoded_mb']:.1f}MB)")
+
+    return save_result("features", {
+        "engine": args.engine, "sentences": len(sentences), "tokens": n_tokens,
+        "repeats": args.repeats, "modes": results, "feature_memo": memo,
+    })
+
+
+def bench_bert_quantize(args):
+    """fp32 versus dynamic int8 BERT on the Gold test split: embedding latency and parity."""
+    import numpy as np
+    from src.caching import EmbeddingStore
+    from src.experiments_runner import get_gold_split
+    from src.features import BERTFeatureExtractor
+
+    _, gold_test = get_gold_split()
+    gold_test = gold_test[:args.limit]
+    sentences = [item['tokens'] for item in gold_test]
+    n_tokens = sum(len(s) for s in sentences)
+
+    embeddings, modes = {}, {}
+    for mode in ("fp32", "int8"):
+        # The extractor is a singleton; reset it to load the other variant
+        BERTFeatureExtractor._instance = None
+        bert = BERTFeatureExtractor(args.model, quantize=mode, threads=args.threads)
+        # Time inference only, not the embedding store
+        bert.cache = EmbeddingStore()
+        bert.get_batch_embeddings(sentences[:args.batch_size], batch_size=args.batch_size)
+        bert.cache = EmbeddingStore()
+        started = time.perf_counter()
+        embeddings[mode] = bert.get_batch_embeddings(sentences, batch_size=args.batch_size)
+        seconds = time.perf_counter() - started
+        modes[mode] = {
+            "seconds": seconds,
+            "sentences_per_second": len(sentences) / seconds,
+            "ms_per_sentence": 1000 * seconds / len(sentences),
+        }
+        print(f"{mode:<5} {len(sentences) / seconds:8.1f} sentences/s {1000 * seconds / len(sentences):8.2f}ms/sentence")
+
+    reference = np.concatenate(embeddings["fp32"]).astype(np.float32)
+    quantized = np.concatenate(embeddings["int8"]).astype(np.float32)
+    cosine = (reference * quantized).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(quantized, axis=1) + 1e-12)
+    parity = {
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        "max_abs_diff": float(np.abs(reference - quantized).max()),
+        "speedup": modes["fp32"]["seconds"] / modes["int8"]["seconds"],
+    }
+    print(f"cosine mean {parity['cosine_mean']:.4f} min {parity['cosine_min']:.4f}, speedup {parity['speedup']:.2f}x")
+
+    if args.crf_model:
+        # Tagging parity of a CRF trained with fp32 embedding features
+        from src.embedding_projection import EmbeddingProjector
+        from src.features import FeatureExtractor
+        from src.models.crf_model import CRFModel
+        from src.preprocessing import Preprocessor
+
+        crf = CRFModel.load(args.crf_model)
+        extractor = FeatureExtractor(use_embeddings=True, embedding_model=args.model,
+                                     embedding_projection=EmbeddingProjector.for_model(args.crf_model))
+        processed = list(Preprocessor(engine=args.engine).process_corpus(sentences))
+        y_test = [item['tags'] for item in gold_test]
+        tags = {}
+        for mode in ("fp32", "int8"):
+            X = [extractor.sent2features(sent, emb) for sent, emb in
+                 zip(processed, extractor.embedding_features(embeddings[mode]))]
+            tags[mode] = crf.predict(X)
+            parity[f"f1_{mode}"], _ = crf.evaluate(X, y_test)
+        pairs = [(a, b) for sa, sb in zip(tags["fp32"], tags["int8"]) for a, b in zip(sa, sb)]
+        parity["tag_agreement"] = sum(a == b for a, b in pairs) / len(pairs)
+        print(f"F1 fp32 {parity['f1_fp32']:.4f} int8 {parity['f1_int8']:.4f}, "
+              f"tag agreement {parity['tag_agreement']:.4f}")
+
+    return save_result("bert_quantize", {
+        "model": args.model, "threads": args.threads, "batch_size": args.batch_size,
+        "sentences": len(sentences), "tokens": n_tokens, "crf_model": args.crf_model,
+        "modes": modes, "parity": parity,
+    })
+
+
+def bench_crf_predict(args):
+    """CRF tagging throughput of CRFModel.predict_batch per worker count."""
+    from src.models.crf_model import CRFModel
+
+    crf = CRFModel.load(args.model)
+    extractor = _model_extractor(args)
+    X = list(extractor.corpus2features(_gold_sentences(args.engine, args.limit))) * args.copies
+
+    expected = None
+    results = {}
+    for workers in args.workers:
+        started = time.perf_counter()
+        tags = list(crf.predict_batch(X, workers=workers, chunk_size=args.chunk_size))
+        seconds = time.perf_counter() - started
+        expected = expected or tags
+        results[workers] = {
+            "seconds": seconds,
+            "sentences_per_second": len(X) / seconds,
+            "matches_serial": [list(t) for t in tags] == [list(t) for t in expected],
+        }
+        print(f"{workers:>3} workers {len(X) / seconds:10.0f} sentences/s")
+
+    return save_result("crf_predict", {
+        "model": args.model, "engine": args.engine, "sentences": len(X), "feature_config": extractor.get_config(),
+        "chunk_size": args.chunk_size,
+        "cpu_count": os.cpu_count(), "workers": results,
+    })
+
+
+def bench_crf_prune(args):
+    """
+    Size / latency / F1 trade-off of pruning small state weights from a CRF, on
+    the Gold test split; optionally writes the model pruned at the chosen threshold.
+    """
+    from src.experiments_runner import get_gold_split
+    from src.models.compact_crf import CompactCRF
+    from src.models.crf_model import CRFModel
+    from src.preprocessing import Preprocessor
+
+    crf = CRFModel.load(args.model)
+    extractor = _model_extractor(args)
+    compact = crf.model if isinstance(crf.model, CompactCRF) else \
+        CompactCRF.from_crf(crf.model, crf.encoder, extractor.get_config())
+
+    _, gold_test = get_gold_split()
+    gold_test = gold_test[:args.limit]
+    processed = Preprocessor(engine=args.engine).process_corpus(item['tokens'] for item in gold_test)
+    X = list(extractor.corpus2features(processed))
+    y_test = [item['tags'] for item in gold_test]
+    reference = [list(tags) for tags in compact.predict(X)]
+    n_tags = sum(len(tags) for tags in reference)
+
+    curve = []
+    for threshold in args.thresholds:
+        pruned = CRFModel()
+        pruned.model = compact.prune(threshold)
+        timings = []
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            tags = pruned.predict(X)
+            timings.append(time.perf_counter() - started)
+        f1, _ = pruned.evaluate(X, y_test)
+        point = {
+            "threshold": threshold,
+            "state_features": len(pruned.model.state_weight),
+            "attributes": len(pruned.model.attributes),
+            "bytes": pruned.model.nbytes,
+            "ms_per_sentence": 1000 * min(timings) / len(X),
+            "f1": f1,
+            "tag_agreement": sum(a == b for sa, sb in zip(reference, tags) for a, b in zip(sa, sb)) / n_tags,
+        }
+        curve.append(point)
+        print(f"|w| > {threshold:<8g} {point['state_features']:8d} weights {point['bytes'] / 1e6:7.2f}MB "
+              f"{point['ms_per_sentence']:6.2f}ms/sentence F1 {f1:.4f} agreement {point['tag_agreement']:.4f}")
+
+    # Operating point: the given threshold, else the last one before F1 first drops
+    # by more than allowed (a later, noisy recovery does not count)
+    selected = args.threshold
+    if selected is None:
+        points = sorted(curve, key=lambda p: p["threshold"])
+        selected = points[0]["threshold"]
+        for point in points[1:]:
+            if points[0]["f1"] - point["f1"] > args.max_f1_drop:
+                break
+            selected = point["threshold"]
+    print(f"Selected threshold {selected:g} (max F1 drop {args.max_f1_drop})")
+    if args.output:
+        compact.prune(selected).save(args.output)
+        logging.info(f"Pruned model written to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+    return save_result("crf_prune", {
+        "model": args.model, "engine": args.engine, "sentences": len(X), "feature_config": extractor.get_config(),
+        "max_f1_drop": args.max_f1_drop, "selected_threshold": selected, "output": args.output, "curve": curve,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NER pipeline performance benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = subparsers.add_parser("nuve-startup", help="Nuve wrapper cold-start time")
+    p.add_argument("--repeats", type=int, default=3)
+    p.set_defaults(func=bench_nuve_startup)
+
+    p = subparsers.add_parser("import-time", help="Cold import time of pipeline modules")
+    p.add_argument("--repeats", type=int, default=5)
+    p.set_defaults(func=bench_import_time)
+
+    p = subparsers.add_parser("features", help="Feature extraction throughput on the Gold corpus")
+    p.add_argument("--engine", default="zemberek")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--memo-sizes", type=lambda v: [int(n) for n in v.split(",")], default=[0, 2048, 50000],
+                   help="FeatureExtractor feature_cache_size values to compare")
+    p.set_defaults(func=bench_features)
+
+    p = subparsers.add_parser("bert-quantize", help="fp32 versus int8 BERT embeddings on the Gold test split")
+    p.add_argument("--model", default="dbmdz/bert-base-turkish-cased")
+    p.add_argument("--threads", type=int, default=None)
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--crf-model", default=None, help="e.g. models/crf_gold_best.pkl, to compare tagging too")
+    p.add_argument("--engine", default="zemberek")
+    p.set_defaults(func=bench_bert_quantize)
+
+    p = subparsers.add_parser("crf-predict", help="CRF tagging throughput per worker count")
+    p.add_argument("--model", default="models/crf_gold_best.pkl")
+    p.add_argument("--config", default='{"use_gazetteers": true, "use_morphology": true}',
+                   help="Feature config the model was trained with: JSON or the experiment result file")
+    p.add_argument("--engine", default=None, help=f"Morphology engine the model was trained with (default: "
+                                                  f"the experiment's, else {DEMO_ENGINE})")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--copies", type=int, default=5, help="Repeat the Gold corpus to get a larger collection")
+    p.add_argument("--workers", type=lambda v: [int(w) for w in v.split(",")], default=[1, 2, 4])
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.set_defaults(func=bench_crf_predict)
+
+    p = subparsers.add_parser("crf-prune", help="Size/latency/F1 of CRF models with small state weights pruned")
+    p.add_argument("--model", default="models/crf_gold_no_emb.pkl")
+    p.add_argument("--config", default='{"use_gazetteers": true, "use_morphology": true}',
+                   help="Feature config the model was trained with: JSON or the experiment result file")
+    p.add_argument("--engine", default=None, help=f"Morphology engine the model was trained with (default: "
+                                                  f"the experiment's, else {DEMO_ENGINE})")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--thresholds", type=lambda v: [float(t) for t in v.split(",")],
+                   default=[0, 0.001, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5])
+    p.add_argument("--max-f1-drop", type=float, default=0.002)
+    p.add_argument("--threshold", type=float, default=None, help="Threshold to write instead of the selected one")
+    p.add_argument("--output", default=None, help="e.g. models/crf_gold_no_emb.crf")
+    p.add_argument("--repeats", type=int, default=3)
+    p.set_defaults(func=bench_crf_prune)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+class StringTable:
+    """
+    Immutable sorted table of strings, laid out as a UTF-8 blob plus an offsets
+    array so it can live in a memory-mapped file. Strings are identified by
+    their position in byte order; find() is a binary search.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        self._n = len(offsets) - 1
+        self.find = lru_cache(maxsize=65536)(self._find)
+
+    @staticmethod
+    def build(strings):
+        """Returns (blob, offsets) arrays for the unique strings, sorted by UTF-8 bytes."""
+        encoded = sorted({s.encode("utf-8") for s in strings})
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        if encoded:
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return blob, offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        return cls(*cls.build(strings))
+
+    def _bytes(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return self._bytes(i).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i]
+
+    def __contains__(self, s):
+        return self.find(s) >= 0
+
+    def _find(self, s):
+        """Returns the id of s, or -1."""
+        key = s.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._bytes(lo) == key:
+            return lo
+        return -1
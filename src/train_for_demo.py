@@ -7,6 +7,7 @@ from sklearn_crfsuite import metrics
 from src.preprocessing import Preprocessor
 from src.features import FeatureExtractor
 from src.models.crf_model import CRFModel
+from src.embedding_projection import EmbeddingProjector
 import joblib
 
 # Configure logging
@@ -40,23 +41,19 @@ def train_specific_model(name, train_sources, feature_config, engine="nuve"):
         use_embeddings=feature_config.get("use_embeddings", False)
     )
     extractor.load_gazetteers("gazetteers")
-
-    # OPTIMIZATION: Pre-analyze all tokens in one batch
-    if engine == "nuve" and prep.nuve:
-        all_tokens = []
-        for item in train_data:
-            all_tokens.extend(item['tokens'])
-        logging.info(f"Pre-analyzing {len(all_tokens)} total tokens ({len(set(all_tokens))} unique)...")
-        prep.nuve.pre_analyze(all_tokens)
+    if extractor.use_embeddings and feature_config.get("embedding_projection"):
+        extractor.fit_embedding_projection(
+            [item['tokens'] for item in train_data], method=feature_config["embedding_projection"],
+            n_components=feature_config.get("embedding_dims", 16),
+            n_buckets=feature_config.get("embedding_buckets")
+        )
 
     X_train, y_train = [], []
     logging.info(f"Extracting features for {len(train_data)} sentences...")
-    for item in train_data:
-        tokens = item['tokens']
-        tags = item['tags']
-        processed = prep.process_sentence(tokens)
-        X_train.append(extractor.sent2features(processed))
-        y_train.append(tags)
+    processed_corpus = prep.process_corpus(item['tokens'] for item in train_data)
+    for item, feats in zip(train_data, extractor.corpus2features(processed_corpus)):
+        X_train.append(feats)
+        y_train.append(item['tags'])
 
     # 3. Train
     logging.info(f"Fitting CRF model for {name}...")
@@ -67,6 +64,8 @@ def train_specific_model(name, train_sources, feature_config, engine="nuve"):
     os.makedirs("models", exist_ok=True)
     save_path = f"models/{name}.pkl"
     crf.save(save_path)
+    if extractor.embedding_projection is not None:
+        extractor.embedding_projection.save(EmbeddingProjector.model_path(save_path))
     logging.info(f"Saved {name} to {save_path}")
 
 def main():
@@ -13,6 +13,153 @@ import json
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+def toy_corpus(copies=1):
+    """CRF testleri için küçük eğitim kümesi: özellik sözlükleri ve etiketler"""
+    X = [[{'word.lower()': 'ali', 'word.istitle()': True, 'in_kisiler_tokens': True},
+          {'word.lower()': 'geldi', 'word.istitle()': False, 'in_kisiler_tokens': False}],
+         [{'word.lower()': 'ankara', 'word.istitle()': True, 'in_yerler_tokens': True},
+          {'word.lower()': 'güzel', 'word.istitle()': False, 'in_yerler_tokens': False}]]
+    y = [['B-PER', 'O'], ['B-LOC', 'O']]
+    return X * copies, y * copies
+
+
+def baseline_word2features(extractor, sent, i):
+    """İlk sürümdeki FeatureExtractor.word2features'ın değiştirilmemiş kopyası"""
+    import re
+
+    def check_gazetteer(text, gazetteer_name, is_token=False):
+        text = text.lower()
+        if is_token:
+            return text in extractor.tokens_set.get(gazetteer_name, set())
+        return text in extractor.full_names.get(gazetteer_name, set())
+
+    word = sent[i]['word']
+    lemma = sent[i]['lemma']
+    pos = sent[i]['pos']
+
+    features = {
+        'bias': 1.0,
+        'word.lower()': word.lower(),
+        'word.isupper()': word.isupper(),
+        'word.istitle()': word.istitle(),
+        'word.isdigit()': word.isdigit(),
+        'word.has_apostrophe': "'" in word or "’" in word,
+    }
+
+    if extractor.use_morphology:
+        features['lemma'] = lemma
+        features['pos'] = pos
+
+        if 'nuve_morph' in sent[i]:
+            morph = sent[i]['nuve_morph']
+            prefix = "nuve."
+        else:
+            morph = sent[i].get('morph', [])
+            prefix = "morph."
+
+        if isinstance(morph, list) and len(morph) > 0:
+            features[f'{prefix}count'] = len(morph)
+            features[f'{prefix}last_suffix_id'] = morph[-1].get('Id', '')
+            features[f'{prefix}has_change'] = any(m.get('HasChange', False) for m in morph)
+
+            suffix_seq = "-".join([m.get('Id', '') for m in morph if m.get('Type') != 'Root'])
+            if suffix_seq:
+                features[f'{prefix}suffix_seq'] = suffix_seq
+
+            for m in morph:
+                for label in m.get('Labels', []):
+                    features[f'{prefix}label_{label}'] = True
+
+        if 'zemberek_morph' in sent[i]:
+            z_morph = sent[i]['zemberek_morph']
+            prefix = "zember."
+
+            if isinstance(z_morph, list) and len(z_morph) > 0:
+                features[f'{prefix}count'] = len(z_morph)
+                features[f'{prefix}last_suffix_id'] = z_morph[-1].get('Id', '')
+
+                suffix_seq = "-".join([m.get('Id', '') for m in z_morph if m.get('Type') != 'Root'])
+                if suffix_seq:
+                    features[f'{prefix}suffix_seq'] = suffix_seq
+
+    if extractor.use_gazetteers:
+        for g_name in ['kisiler', 'yerler', 'sirketler', 'kurumlar', 'film_muzik', 'topluluklar']:
+            features[f'in_{g_name}_tokens'] = check_gazetteer(word, g_name, is_token=True)
+
+            if i < len(sent) - 1:
+                bigram = f"{word} {sent[i+1]['word']}"
+                if check_gazetteer(bigram, g_name):
+                    features[f'start_bigram_{g_name}'] = True
+
+            if i < len(sent) - 2:
+                trigram = f"{word} {sent[i+1]['word']} {sent[i+2]['word']}"
+                if check_gazetteer(trigram, g_name):
+                    features[f'start_trigram_{g_name}'] = True
+
+            if i > 0:
+                prev_bigram = f"{sent[i-1]['word']} {word}"
+                if check_gazetteer(prev_bigram, g_name):
+                    features[f'inside_bigram_{g_name}'] = True
+
+        word_l = word.lower()
+        features.update({
+            'kw_holding': 'holding' in word_l,
+            'kw_bank': 'banka' in word_l,
+            'kw_company_suffix': any(s in word_l for s in ['a.ş', 'ltd', 'şirketi']),
+            'kw_group_suffix': any(s in word_l for s in ['grubu', 'kulübü', 'derneği', 'partisi']),
+            'kw_org_suffix': any(s in word_l for s in ['vakfı', 'üniversitesi', 'belediyesi'])
+        })
+
+        if re.search(r'(Derneği|Kulübü|Topluluğu)$', word):
+            features['suffix_group'] = True
+        if re.search(r'(Vakfı|Birliği|Fonu)$', word):
+            features['suffix_org'] = True
+
+    if i > 0:
+        word1 = sent[i-1]['word']
+        features.update({
+            '-1:word.lower()': word1.lower(),
+            '-1:word.istitle()': word1.istitle(),
+            '-1:word.isupper()': word1.isupper(),
+        })
+        if extractor.use_morphology:
+            features['-1:lemma'] = sent[i-1]['lemma']
+    else:
+        features['BOS'] = True
+
+    if i < len(sent)-1:
+        word1 = sent[i+1]['word']
+        features.update({
+            '+1:word.lower()': word1.lower(),
+            '+1:word.istitle()': word1.istitle(),
+            '+1:word.isupper()': word1.isupper(),
+        })
+        if extractor.use_morphology:
+            features['+1:lemma'] = sent[i+1]['lemma']
+    else:
+        features['EOS'] = True
+
+    return features
+
+
+def tiny_bert(path):
+    """Rastgele ağırlıklı küçük bir BERT modelini ve tokenizer'ını path'e kaydeder"""
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "ali", "ankara", "##ya", "##da", "gel", "##di",
+             "istanbul", "türk", "hava", "yol", "##ları", "ve", "."]
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizerFast(vocab_file).save_pretrained(path)
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=64)
+    BertModel(config).save_pretrained(path)
+    return path
+
+
 class TestPreprocessing(unittest.TestCase):
     """Preprocessing modülü testleri"""
 
@@ -36,6 +183,65 @@ class TestPreprocessing(unittest.TestCase):
         self.assertEqual(len(result), 2)
         self.assertIn("word", result[0])
 
+    def test_analysis_cache(self):
+        """Tekrarlanan kelimeler önbellekten gelmeli"""
+        from src.preprocessing import Preprocessor
+        prep = Preprocessor()
+        first = prep.process_sentence(["Ankara", "güzel", "Ankara"])
+        info = prep.cache_info()
+        second = prep.process_sentence(["Ankara", "güzel"])
+        self.assertEqual(first[:2], second)
+        if prep.morphology:
+            self.assertEqual(prep.cache_info()["zemberek_calls"], info["zemberek_calls"])
+            self.assertGreater(prep.cache_info()["hits"], info["hits"])
+
+    def test_morphology_store(self):
+        """İkinci çalıştırma analizleri diskteki depodan almalı; regex yedeği depoya yazılmamalı"""
+        import tempfile
+        from unittest import mock
+        from src.caching import LRUCache, MorphologyStore
+        from src.preprocessing import Preprocessor
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ):
+            path = os.path.join(tmp, "morphology.sqlite")
+            os.environ["NEREXT_MORPH_CACHE"] = path
+            prep = Preprocessor()
+            if not prep.morphology:
+                prep.store.close()
+                self.skipTest("Zemberek kullanılamıyor")
+            self.assertEqual(prep.store.path, path)
+
+            # Zemberek'in analiz edemediği kelime regex yedeğine düşer
+            analyze = prep._zemberek_analyze
+
+            def failing(token):
+                if token == "Qxzw":
+                    raise ValueError(token)
+                return analyze(token)
+
+            tokens = ["Ankara", "güzel", "Qxzw", "kitaplar"]
+            with mock.patch.object(prep, "_zemberek_analyze", side_effect=failing):
+                first = prep.process_sentence(tokens)
+            self.assertEqual(prep.cache_info()["zemberek_calls"], 4)
+            prep.store.close()
+
+            stored = MorphologyStore(path)
+            self.assertEqual(sorted(stored.get_many("zemberek", prep.zemberek_version, tokens)),
+                             ["Ankara", "güzel", "kitaplar"])
+            stored.close()
+
+            # İkinci çalıştırma: boş bellek önbelleği, diskten yeniden açılan depo
+            prep.cache = LRUCache()
+            prep.store = MorphologyStore(path)
+            prep.zemberek_calls = 0
+            with mock.patch.object(prep, "_zemberek_analyze", side_effect=failing) as called:
+                second = prep.process_sentence(tokens)
+            self.assertEqual(second, first)
+            # Yalnızca depoya yazılmamış yedek kelime yeniden denenir
+            self.assertEqual(prep.cache_info()["zemberek_calls"], 1)
+            self.assertEqual([c.args[0] for c in called.call_args_list], ["Qxzw"])
+            prep.store.close()
+
 
 class TestFeatures(unittest.TestCase):
     """Feature extraction modülü testleri"""
@@ -72,6 +278,253 @@ class TestFeatures(unittest.TestCase):
         self.assertIsInstance(features, dict)
         self.assertIn("word.lower()", features)
 
+    def test_sent2features_matches_word2features(self):
+        """Cümle düzeyi özellikler eski (token token) word2features çıktısıyla aynı olmalı"""
+        import tempfile
+        from src.features import FeatureExtractor
+
+        def morph(*ids):
+            return [{'Id': ids[0], 'Type': 'Root', 'Labels': ['Noun']}] + \
+                   [{'Id': i, 'Type': 'Suffix', 'HasChange': i == 'A3sg', 'Labels': [i]} for i in ids[1:]]
+
+        words = ["Mustafa", "Kemal", "Atatürk", "Hava", "Yolları", "Genel", "Müdürlüğü", "ile",
+                 "Koç", "Holding", "ve", "TEMA", "Vakfı", "İSTANBUL'a", "2023", "gitti", "."]
+        sent = []
+        for n, word in enumerate(words):
+            row = {'word': word, 'lemma': word.lower().split("'")[0], 'pos': 'Noun' if n % 3 else 'Verb'}
+            if n % 2:
+                row['nuve_morph'] = morph(word.lower(), 'A3sg', 'P3sg')
+                row['zemberek_morph'] = morph(word.lower(), 'A3sg')
+            elif n % 5:
+                row['morph'] = morph(word.lower(), 'Dat')
+            sent.append(row)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            gazetteers = {
+                "kisiler": ["Mustafa Kemal Atatürk", "Mustafa Kemal", "Kemal"],
+                "kurumlar": ["Hava Yolları Genel Müdürlüğü", "Genel Müdürlüğü", "TEMA Vakfı"],
+                "sirketler": ["Koç Holding", "Hava Yolları"],
+                "yerler": ["İstanbul'a", "Ankara"],
+            }
+            for category, entries in gazetteers.items():
+                with open(os.path.join(tmp, f"{category}.txt"), "w", encoding="utf-8") as f:
+                    f.write("\n".join(entries) + "\n")
+
+            for use_morphology in (True, False):
+                feat = FeatureExtractor(tmp, use_morphology=use_morphology)
+                expected = [baseline_word2features(feat, sent, i) for i in range(len(sent))]
+                # Sonradan eklenen tek fark: 3 kelimeden uzun girdiler
+                expected[3]['start_long_kurumlar'] = True
+                for i in (4, 5, 6):
+                    expected[i]['inside_long_kurumlar'] = True
+                self.assertEqual(feat.sent2features(sent), expected)
+                self.assertEqual([feat.word2features(sent, i) for i in range(len(sent))], expected)
+
+                # Bağlam önbelleği açıkken de (ikinci çağrı önbellekten) aynı özellikler çıkmalı
+                memo = FeatureExtractor(tmp, use_morphology=use_morphology, feature_cache_size=100)
+                self.assertEqual(memo.sent2features(sent), expected)
+                self.assertEqual(memo.sent2features(sent), expected)
+                self.assertEqual(memo.feature_cache_info()["hits"], len(sent))
+
+    def test_embedding_store(self):
+        """Embedding deposu bellek sınırına uymalı ve diskten geri okunabilmeli"""
+        import tempfile
+        import numpy as np
+        from src.caching import EmbeddingStore, sentence_key
+
+        with tempfile.TemporaryDirectory() as tmp:
+            vectors = {sentence_key(["cümle", str(i)]): np.full((4, 8), i, dtype=np.float32) for i in range(3)}
+            store = EmbeddingStore(tmp, max_bytes=2 * 4 * 8 * 2)
+            store.put_many("model", vectors)
+            self.assertLessEqual(store.nbytes, store.max_bytes)
+            store.close()
+
+            reopened = EmbeddingStore(tmp)
+            found = reopened.get_many("model", list(vectors))
+            self.assertEqual(len(found), 3)
+            for key, value in vectors.items():
+                self.assertEqual(found[key].dtype, np.float16)
+                self.assertTrue(np.array_equal(found[key], value))
+            self.assertEqual(reopened.get_many("başka", list(vectors)), {})
+            reopened.close()
+
+        # Disk kopyası yalnızca NEREXT_EMBEDDING_CACHE ile açılmalı
+        from unittest import mock
+        from src.caching import get_embedding_store
+        with mock.patch.dict(os.environ):
+            os.environ.pop("NEREXT_EMBEDDING_CACHE", None)
+            self.assertIsNone(get_embedding_store().path)
+
+    def test_embedding_projection(self):
+        """Embedding projeksiyonu istenen boyutta (ve kovalı) özellik üretmeli"""
+        import numpy as np
+        from src.embedding_projection import EmbeddingProjector
+
+        vectors = np.random.default_rng(0).standard_normal((500, 32)).astype(np.float32)
+        projector = EmbeddingProjector("pca", n_components=4).fit(vectors)
+        projected = projector.transform(vectors)
+        self.assertEqual(projected.shape, (500, 4))
+        self.assertTrue(np.allclose(projected.std(axis=0), 1, atol=1e-3))
+        # Parmak izi, projeksiyonun öğrenildiği veriyi ayırt etmeli
+        self.assertEqual(projector.fingerprint(), EmbeddingProjector("pca", n_components=4).fit(vectors).fingerprint())
+        self.assertNotEqual(projector.fingerprint(), EmbeddingProjector("pca", n_components=4).fit(vectors[:250]).fingerprint())
+
+        bucketed = EmbeddingProjector("random", n_components=4, n_buckets=3).fit(vectors)
+        features = bucketed.features(vectors[:2])
+        self.assertEqual(sorted(features[0]), ['emb_0', 'emb_1', 'emb_2', 'emb_3'])
+        self.assertIn(features[0]['emb_0'], ['q0', 'q1', 'q2'])
+
+    def test_gazetteer_matcher(self):
+        """Çok kelimeli gazetteer girdileri her uzunlukta bulunmalı"""
+        from src.gazetteer_matcher import GazetteerMatcher
+        matcher = GazetteerMatcher.from_gazetteers({
+            "kurumlar": {"türk hava yolları", "hava yolları genel müdürlüğü"},
+            "yerler": {"ankara"},
+        })
+        spans = matcher.find_spans(["Türk", "Hava", "Yolları", "Genel", "Müdürlüğü", "Ankara"])
+        self.assertIn((0, 3, "kurumlar"), spans)
+        self.assertIn((1, 5, "kurumlar"), spans)
+        self.assertIn((5, 6, "yerler"), spans)
+
+    def test_gazetteer_index(self):
+        """Derlenmiş gazetteer indeksi metin dosyalarıyla aynı cevapları vermeli ve değişince yeniden derlenmeli"""
+        import tempfile
+        from src.gazetteer_matcher import GazetteerIndex, GazetteerMatcher, INDEX_FILENAME, read_gazetteers
+
+        with tempfile.TemporaryDirectory() as tmp:
+            gazetteers = {
+                "kurumlar": ["Türk Hava Yolları", "Hava Yolları Genel Müdürlüğü", "TBMM"],
+                "yerler": ["Ankara", "Hava", "Yeni Zelanda"],
+            }
+            for category, entries in gazetteers.items():
+                with open(os.path.join(tmp, f"{category}.txt"), "w", encoding="utf-8") as f:
+                    f.write("\n".join(entries) + "\n")
+
+            index = GazetteerIndex.load(tmp)
+            self.assertTrue(os.path.exists(os.path.join(tmp, INDEX_FILENAME)))
+            full_names, tokens_set = read_gazetteers(tmp)
+            self.assertEqual(index.categories, sorted(full_names))
+
+            for category in full_names:
+                for entry in full_names[category] | {"türk hava", "yolları genel", "istanbul"}:
+                    self.assertEqual(index.contains(entry, category), entry in full_names[category])
+                for token in set().union(*tokens_set.values()) | {"istanbul"}:
+                    self.assertEqual(index.has_token(token, category), token in tokens_set[category])
+            for token in set().union(*tokens_set.values()) | {"istanbul"}:
+                expected = sum(1 << i for i, c in enumerate(index.categories) if token in tokens_set[c])
+                self.assertEqual(index.token_mask(token), expected)
+
+            matcher = GazetteerMatcher.from_gazetteers(full_names)
+            sentence = ["Türk", "Hava", "Yolları", "Genel", "Müdürlüğü", "Ankara", "ve", "Yeni", "Zelanda", "TBMM"]
+            self.assertEqual(sorted(index.find_spans(sentence)), sorted(matcher.find_spans(sentence)))
+
+            # Aynı dosyalarla tekrar yükleme derlenmiş dosyayı kullanmalı, dosya değişince yeniden derlenmeli
+            self.assertEqual(GazetteerIndex.load(tmp).header, index.header)
+            with open(os.path.join(tmp, "yerler.txt"), "a", encoding="utf-8") as f:
+                f.write("Bursa\n")
+            rebuilt = GazetteerIndex.load(tmp)
+            self.assertNotEqual(rebuilt.header["signature"], index.header["signature"])
+            self.assertTrue(rebuilt.contains("bursa", "yerler"))
+            self.assertIn((0, 1, "yerler"), rebuilt.find_spans(["Bursa"]))
+
+
+class TestBERTFeatures(unittest.TestCase):
+    """Yerel küçük bir BERT modeliyle embedding çıkarımı testleri"""
+
+    def setUp(self):
+        import importlib.util
+        import tempfile
+        from unittest import mock
+        if importlib.util.find_spec("torch") is None or importlib.util.find_spec("transformers") is None:
+            self.skipTest("torch ve transformers kurulu değil")
+        from src.features import BERTFeatureExtractor
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model_dir = tiny_bert(self.tmp.name)
+        self.env = mock.patch.dict(os.environ)
+        self.env.start()
+        for name in ("NEREXT_BERT_QUANTIZE", "NEREXT_BERT_THREADS", "NEREXT_EMBEDDING_CACHE"):
+            os.environ.pop(name, None)
+        BERTFeatureExtractor._instance = None
+        self.sentences = [["Ali", "Ankaraya", "geldi", "."], ["Türk", "Hava", "Yolları"],
+                          ["İstanbul", "ve", "Ankarada", "ali", "yolları", "geldi", "."], []]
+
+    def tearDown(self):
+        from src.features import BERTFeatureExtractor
+        BERTFeatureExtractor._instance = None
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def extractor(self, **kwargs):
+        from src.features import BERTFeatureExtractor
+        BERTFeatureExtractor._instance = None
+        return BERTFeatureExtractor(self.model_dir, **kwargs)
+
+    def test_quantization(self):
+        """int8 modu ortam değişkeninden okunmalı ve fp32'ye yakın embedding üretmeli"""
+        import warnings
+        import numpy as np
+
+        fp32 = self.extractor()
+        self.assertIsNone(fp32.quantize)
+        expected = fp32.get_batch_embeddings(self.sentences)
+
+        os.environ["NEREXT_BERT_QUANTIZE"] = "INT8"
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            int8 = self.extractor()
+        self.assertFalse([w for w in caught if issubclass(w.category, DeprecationWarning)])
+        self.assertEqual(int8.quantize, "int8")
+        self.assertNotEqual(int8.store_name, fp32.store_name)
+        self.assertIn("quantized", type(int8.model.encoder.layer[0].intermediate.dense).__module__)
+        for a, b in zip(int8.get_batch_embeddings(self.sentences), expected):
+            self.assertEqual(a.shape, b.shape)
+            self.assertTrue(np.allclose(a, b, atol=0.02))
+
+        # Kapalı ya da tanınmayan değerler fp32'ye dönmeli; açık argümandaki hata ise bildirilmeli
+        for value in ("off", "fp32", "0"):
+            os.environ["NEREXT_BERT_QUANTIZE"] = value
+            self.assertIsNone(self.extractor().quantize)
+        os.environ["NEREXT_BERT_QUANTIZE"] = "int4"
+        os.environ["NEREXT_BERT_THREADS"] = "many"
+        with self.assertLogs(level="WARNING") as logs:
+            self.assertIsNone(self.extractor().quantize)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(self.extractor(quantize="fp32").quantize, None)
+        with self.assertRaises(ValueError):
+            self.extractor(quantize="int4")
+
+    def test_batch_embeddings(self):
+        """Toplu embedding'ler cümle cümle (dolgusuz) hesaplananlarla aynı olmalı"""
+        import torch
+        import numpy as np
+
+        bert = self.extractor()
+
+        def reference(tokens):
+            # İlk sürümdeki yol: tek cümle, alt kelime vektörlerinin döngüyle ortalaması
+            inputs = bert.tokenizer(tokens, is_split_into_words=True, return_tensors="pt")
+            with torch.no_grad():
+                hidden = bert.model(**{k: v for k, v in inputs.items() if k in bert.forward_args}).last_hidden_state[0]
+            vectors = {}
+            for i, word in enumerate(inputs.word_ids()):
+                if word is not None:
+                    vectors.setdefault(word, []).append(hidden[i])
+            return np.stack([torch.stack(vectors[w]).mean(dim=0).numpy() for w in range(len(tokens))])
+
+        # Farklı uzunluklar, tekrar eden ve boş cümle; batch_size=2 ile birden fazla dolgulu batch
+        sentences = self.sentences + [self.sentences[0]]
+        batched = bert.get_batch_embeddings(sentences, batch_size=2)
+        self.assertEqual(len(batched), len(sentences))
+        self.assertEqual(batched[-2].shape[0], 0)
+        for tokens, vectors in zip(sentences, batched):
+            if not tokens:
+                continue
+            self.assertEqual(vectors.dtype, np.float16)
+            self.assertEqual(vectors.shape, (len(tokens), bert.model.config.hidden_size))
+            self.assertTrue(np.allclose(vectors, reference(tokens), rtol=1e-3, atol=1e-3))
+            self.assertTrue(np.array_equal(bert.get_sentence_embeddings(tokens), vectors))
+
 
 class TestDataAugmentor(unittest.TestCase):
     """Data augmentation modülü testleri"""
@@ -116,6 +569,395 @@ class TestModels(unittest.TestCase):
         model = CRFModel()
         self.assertIsNotNone(model)
 
+    def test_encoded_features(self):
+        """Sayısal kodlanmış özelliklerle eğitilen CRF aynı tahminleri vermeli"""
+        from src.models.crf_model import CRFModel
+        from src.feature_encoding import FeatureEncoder
+
+        X, y = toy_corpus()
+
+        encoded = FeatureEncoder().encode(X)
+        self.assertEqual(len(encoded.take([1])), 1)
+        self.assertEqual(list(encoded.take([1])), [encoded[1]])
+
+        plain, compact = CRFModel(), CRFModel()
+        plain.train(X, y)
+        compact.train(encoded, y)
+        self.assertEqual([list(s) for s in plain.predict(X)], [list(s) for s in compact.predict(X)])
+
+        # Kodsuz model aynı yola kaydedilince eski kodlayıcı dosyası kalmamalı
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.joblib")
+            compact.save(path)
+            plain.save(path)
+            self.assertFalse(os.path.exists(CRFModel.encoder_path(path)))
+            reloaded = CRFModel.load(path)
+            self.assertIsNone(reloaded.encoder)
+            self.assertEqual([list(s) for s in reloaded.predict(X)], y)
+
+    def test_compact_export(self):
+        """Kompakt formata aktarılan model aynı tahminleri vermeli"""
+        import tempfile
+        from src.models.crf_model import CRFModel
+
+        X, y = toy_corpus()
+
+        model = CRFModel()
+        model.train(X, y)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.crf")
+            model.export(path)
+            compact = CRFModel.load(path)
+            self.assertEqual(list(compact.model.classes_), list(model.model.classes_))
+            self.assertEqual([list(s) for s in compact.predict(X)], [list(s) for s in model.predict(X)])
+
+            # Budama küçük ağırlıkları ve ağırlıksız kalan öznitelikleri atmalı
+            weights = compact.model.state_features_
+            threshold = sorted(abs(w) for w in weights.values())[len(weights) // 2]
+            pruned = compact.model.prune(threshold)
+            self.assertEqual(pruned.state_features_, {k: w for k, w in weights.items() if abs(w) > threshold})
+            self.assertEqual(len(pruned.attributes), len({a for a, _ in pruned.state_features_}))
+            self.assertEqual(compact.model.prune(0).state_features_, weights)
+
+    def test_compact_export_hashed(self):
+        """Hash kodlamalı model kompakt formatta EncodedCorpus üzerinde aynı tahminleri vermeli"""
+        import tempfile
+        from src.models.crf_model import CRFModel
+        from src.feature_encoding import FeatureEncoder
+
+        X, y = toy_corpus()
+        encoded = FeatureEncoder(mode="hash").encode(X)
+        model = CRFModel()
+        model.train(encoded, y)
+        expected = [list(s) for s in model.predict(encoded)]
+        self.assertEqual(expected, y)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.crf")
+            model.export(path)
+            compact = CRFModel.load(path)
+            self.assertEqual(compact.predict(encoded), expected)
+            self.assertEqual(compact.predict(X), expected)
+            self.assertEqual(list(compact.predict_batch(encoded, workers=1, chunk_size=1)), expected)
+            with self.assertRaises(ValueError):
+                compact.predict(FeatureEncoder().encode(X))
+
+    def test_numpy_viterbi_matches_crfsuite(self):
+        """NumPy Viterbi, Gold test kümesinde CRFModel.predict ile aynı etiketleri vermeli"""
+        from src.models.crf_model import CRFModel
+        from src.models.compact_crf import CompactCRF
+        from src.experiments_runner import get_gold_split
+        from src.preprocessing import Preprocessor
+        from src.features import FeatureExtractor
+
+        _, gold_test = get_gold_split()
+        feat = FeatureExtractor("gazetteers")
+        X = list(feat.corpus2features(Preprocessor().process_corpus(item['tokens'] for item in gold_test)))
+
+        model = CRFModel.load("models/crf_gold_gaz_only.pkl")
+        compact = CompactCRF.from_crf(model.model)
+        self.assertEqual(compact.predict(X), [list(s) for s in model.predict(X)])
+
+        # Marjinaller crfsuite ile, en iyi n yolun ilki Viterbi ile örtüşmeli
+        expected = model.model.predict_marginals(X[:20])
+        for sent_expected, sent_actual in zip(expected, compact.predict_marginals(X[:20])):
+            for token_expected, token_actual in zip(sent_expected, sent_actual):
+                for label, p in token_expected.items():
+                    self.assertAlmostEqual(token_actual[label], p, places=4)
+        self.assertEqual(compact.predict_nbest(X[0], 3)[0][0], compact.predict_single(X[0]))
+
+    def test_predict_batch(self):
+        """Paralel toplu tahmin sırayı korumalı ve predict ile aynı olmalı"""
+        from src.models.crf_model import CRFModel
+
+        X, y = toy_corpus(5)
+
+        model = CRFModel()
+        model.train(X, y)
+        expected = [list(s) for s in model.predict(X)]
+        self.assertEqual([list(s) for s in model.predict_batch(X, workers=1, chunk_size=3)], expected)
+        self.assertEqual([list(s) for s in model.predict_batch(iter(X), workers=2, chunk_size=3)], expected)
+
+    def test_parallel_folds(self):
+        """Paralel çapraz doğrulama katmanları sıralı çalıştırmayla aynı sonuçları vermeli"""
+        import tempfile
+        from sklearn.model_selection import KFold
+        from src.experiments_runner import run_folds
+
+        X, y = toy_corpus(6)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            def folds(name):
+                return [(train_idx, val_idx, os.path.join(tmp, f"{name}_{i}.joblib"),
+                         os.path.join(tmp, f"{name}_{i}_weights.json"))
+                        for i, (train_idx, val_idx) in enumerate(KFold(n_splits=3).split(X))]
+
+            serial = run_folds(X, y, folds("serial"), workers=1)
+            parallel = run_folds(X, y, folds("parallel"), workers=3)
+            self.assertEqual(parallel, serial)
+            self.assertTrue(all(os.path.exists(os.path.join(tmp, f"parallel_{i}.joblib")) for i in range(3)))
+
+            # Linux dışında (ör. macOS) süreç çatallanmamalı, katmanlar sırayla çalışmalı
+            from unittest import mock
+            with mock.patch("sys.platform", "darwin"), \
+                    mock.patch("src.experiments_runner.ProcessPoolExecutor", side_effect=AssertionError):
+                self.assertEqual(run_folds(X, y, folds("darwin"), workers=3), serial)
+
+
+# Nuve wrapper'ının iki protokolünü taklit eden sahte süreç (NUVE_WRAPPER_BIN ile kullanılır).
+# FAKE_NUVE_CRASH_ON kelimesinde çöker, FAKE_NUVE_GARBAGE_ON kelimesinde bozuk yanıt gönderir,
+# FAKE_NUVE_LOG dosyasına "<pid>\t<kelime>" yazar, FAKE_NUVE_DELAY kadar bekler.
+FAKE_NUVE_WRAPPER = r"""
+import os, sys, json, struct, time
+
+crash_on = os.environ.get("FAKE_NUVE_CRASH_ON")
+garbage_on = os.environ.get("FAKE_NUVE_GARBAGE_ON")
+delay = float(os.environ.get("FAKE_NUVE_DELAY", "0"))
+log_path = os.environ.get("FAKE_NUVE_LOG")
+
+def received(word):
+    if log_path:
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(f"{os.getpid()}\t{word}\n")
+    time.sleep(delay)
+    if word == crash_on:
+        os._exit(1)
+
+def string(value):
+    data = value.encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+def run_compact():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    def frame(payload):
+        stdout.write(struct.pack("<I", len(payload)) + payload)
+        stdout.flush()
+    frame(b"R")
+    defined = False
+    while True:
+        header = stdin.read(4)
+        if len(header) < 4:
+            return
+        payload = stdin.read(struct.unpack("<I", header)[0])
+        kind, word = payload[:1], payload[1:].decode("utf-8")
+        if kind == b"Q":
+            return
+        if kind == b"P":
+            frame(b"O")
+            continue
+        received(word)
+        if not defined:
+            frame(b"M" + struct.pack("<I", 0) + string("Noun") + string("") + string("Noun") + bytes([1]) + string("A3sg"))
+            defined = True
+        # Tanımlanmamış ek numarası okuyucuda KeyError'a yol açar
+        index = 99 if word == garbage_on else 0
+        frame(b"A" + bytes([0]) + string(word.lower()) + struct.pack("<H", 1) + struct.pack("<IB", index, 0) + string(""))
+
+def run_json():
+    print("\x01READY", flush=True)
+    for line in sys.stdin:
+        line = line.rstrip("\n")
+        if line == "\x01QUIT":
+            return
+        if line == "\x01PING":
+            print("\x01PONG", flush=True)
+            continue
+        received(line)
+        if line == garbage_on:
+            print("{bozuk", flush=True)
+            continue
+        morpheme = {"Surface": "", "LexicalForm": "", "Id": "Noun", "Type": "Noun", "Labels": ["A3sg"], "HasChange": False}
+        print(json.dumps({"Analyses": [{"Stem": line.lower(), "Morphemes": [morpheme]}]}), flush=True)
+
+run_compact() if "--compact" in sys.argv else run_json()
+"""
+
+
+@unittest.skipIf(os.name == "nt", "Sahte wrapper doğrudan çalıştırılabilir betik olarak başlatılıyor")
+class TestNuveBridge(unittest.TestCase):
+    """Nuve wrapper süreç iletişimi testleri (sahte wrapper ile)"""
+
+    def setUp(self):
+        import tempfile
+        from unittest import mock
+        from src.nuve_bridge import NuveBridge
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.script = os.path.join(self.tmp.name, "fake_nuve_wrapper")
+        with open(self.script, "w", encoding="utf-8") as f:
+            f.write(f"#!{sys.executable}\n{FAKE_NUVE_WRAPPER}")
+        os.chmod(self.script, 0o755)
+        self.log = os.path.join(self.tmp.name, "requests.log")
+        self.env = mock.patch.dict(os.environ, {
+            "NUVE_WRAPPER_BIN": self.script, "NEREXT_MORPH_CACHE": "off", "FAKE_NUVE_LOG": self.log})
+        self.env.start()
+        NuveBridge._instance = None
+
+    def tearDown(self):
+        from src.nuve_bridge import NuveBridge
+        if NuveBridge._instance is not None:
+            NuveBridge._instance.close()
+        NuveBridge._instance = None
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def requests(self):
+        """Sahte wrapper'a gelen (pid, kelime) istekleri"""
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log, encoding="utf-8") as f:
+            return [tuple(line.rstrip("\n").split("\t")) for line in f]
+
+    def test_handshake(self):
+        """Her iki protokolde READY/PING el sıkışması ve analiz çalışmalı"""
+        from src.nuve_bridge import NuveWorker
+
+        for protocol in ("json", "compact"):
+            command = [self.script] + (["--compact"] if protocol == "compact" else [])
+            worker = NuveWorker(command, protocol=protocol).start()
+            self.assertTrue(worker.ping())
+            first, second = worker.analyze(["Ankara", "İzmir"])
+            if protocol == "json":
+                self.assertEqual(first["Analyses"][0]["Stem"], "ankara")
+            else:
+                # Ek tanımları bir kez çözülüp paylaşılmalı
+                self.assertEqual(first[:2], (0, "ankara"))
+                self.assertIs(first[2][0][0], second[2][0][0])
+                self.assertEqual(first[2][0][0], ("Noun", "", "Noun", ("A3sg",)))
+            worker.close()
+            self.assertFalse(worker.ping())
+
+    def test_malformed_response(self):
+        """Bozuk yanıt bekleyen tüm istekleri zaman aşımı beklemeden düşürmeli"""
+        import time
+        from src.nuve_bridge import NuveWorker, NuveWorkerError
+
+        os.environ["FAKE_NUVE_GARBAGE_ON"] = "bozuk"
+        worker = NuveWorker([self.script, "--compact"], protocol="compact").start()
+        futures = worker.submit(["iyi", "bozuk", "sonra"])
+        started = time.perf_counter()
+        self.assertEqual(next(worker.iter_results(futures[:1]))[1], "iyi")
+        with self.assertRaises(NuveWorkerError):
+            list(worker.iter_results(futures[1:]))
+        self.assertLess(time.perf_counter() - started, 5)
+        self.assertFalse(worker.is_alive())
+        worker.close()
+
+    def test_crash_restart(self):
+        """Wrapper'ı çökerten kelime UNK olmalı, süreç yeniden başlatılmalı"""
+        from src.nuve_bridge import NuveBridge
+
+        os.environ["FAKE_NUVE_CRASH_ON"] = "bomba"
+        bridge = NuveBridge(workers=1)
+        results = bridge.analyze_batch(["Ali", "bomba", "Veli"])
+        self.assertEqual(results["Ali"]["lemma"], "ali")
+        self.assertEqual(results["Veli"]["lemma"], "veli")
+        self.assertEqual(results["bomba"]["pos"], "UNK")
+        self.assertGreaterEqual(bridge.restarts, 1)
+        self.assertTrue(bridge.health_check())
+        self.assertEqual(bridge.analyze("Ayşe")["lemma"], "ayşe")
+
+    def test_sharding(self):
+        """pre_analyze benzersiz kelimeleri birden fazla sürece dağıtmalı"""
+        from src.nuve_bridge import NuveBridge
+
+        bridge = NuveBridge(workers=2)
+        bridge.min_shard_size = 2
+        tokens = [f"Kelime{i}" for i in range(8)]
+        results = bridge.pre_analyze(tokens + tokens[:3])
+        self.assertEqual({t: r["lemma"] for t, r in results.items()}, {t: t.lower() for t in tokens})
+        requests = self.requests()
+        self.assertEqual(sorted(word for _, word in requests), sorted(tokens))
+        self.assertEqual(len({pid for pid, _ in requests}), 2)
+        # Ek süreçler yalnızca toplu analiz için açılır
+        self.assertTrue(all(worker is None for worker in bridge.pool[1:]))
+
+    def test_sharding_isolates_poison_token(self):
+        """Parçalı analizde wrapper'ı çökerten kelime yeniden gönderilmemeli"""
+        from src.nuve_bridge import NuveBridge
+
+        os.environ["FAKE_NUVE_CRASH_ON"] = "bomba"
+        bridge = NuveBridge(workers=2)
+        bridge.min_shard_size = 2
+        tokens = [f"Kelime{i}" for i in range(7)] + ["bomba"]
+        results = bridge.pre_analyze(tokens)
+        self.assertEqual(results["bomba"]["pos"], "UNK")
+        self.assertEqual(results["Kelime0"]["lemma"], "kelime0")
+        # Bir kez toplu istekte, bir kez tek başına; son geçişte değil
+        self.assertEqual([word for _, word in self.requests()].count("bomba"), 2)
+
+    def test_hybrid_rows(self):
+        """Hibrit satırlar: Nuve alanları wrapper'dan, zemberek_* alanları regex yedeğinden"""
+        from src.preprocessing import Preprocessor
+
+        prep = Preprocessor(engine="hybrid")
+        tokens = ["Ankara'ya", "gittim", "Ankara'ya"]
+        rows = prep.process_sentence(tokens)
+        self.assertEqual(rows, list(prep.process_corpus([tokens]))[0])
+        for token, row in zip(tokens, rows):
+            lemma, pos = prep._regex_analyze(token)
+            self.assertEqual(row['lemma'], token.lower())
+            self.assertEqual(row['nuve_lemma'], token.lower())
+            self.assertEqual(row['nuve_morph'][0]['Id'], "Noun")
+            self.assertEqual((row['zemberek_lemma'], row['zemberek_pos'], row['zemberek_morph']), (lemma, pos, {}))
+            self.assertEqual(row['pos'], pos)
+
+    def test_inflight_coalescing(self):
+        """Eşzamanlı çağrılarda aynı kelime wrapper'a bir kez gönderilmeli"""
+        from concurrent.futures import ThreadPoolExecutor
+        from src.nuve_bridge import NuveBridge
+
+        os.environ["FAKE_NUVE_DELAY"] = "0.05"
+        bridge = NuveBridge(workers=1)
+        tokens = ["Ankara", "İzmir", "Bursa", "Konya"]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(bridge.analyze_batch, [tokens] * 4))
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(sorted(word for _, word in self.requests()), sorted(tokens))
+
+    def test_async_coalescing(self):
+        """Asenkron çağrılar birleşmeli; iptal edilen çağrı diğer bekleyenleri etkilememeli"""
+        import asyncio
+        from src.nuve_bridge import NuveBridge
+        from src.preprocessing import Preprocessor
+
+        os.environ["FAKE_NUVE_DELAY"] = "0.05"
+        bridge = NuveBridge(workers=1)
+        first, second = ["Ankara", "İzmir", "Bursa", "Konya"], ["Sivas", "Kars"]
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            # İlk çağrı kelimeleri üstlenir; ikincisi aynı kelimeleri bekler ve zaman aşımıyla iptal edilir
+            claimer = asyncio.ensure_future(bridge.aanalyze_batch(first))
+            await asyncio.sleep(0.02)
+            sync_waiter = loop.run_in_executor(None, bridge.analyze_batch, first)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(bridge.aanalyze_batch(first), 0.02)
+            # Üstlenen çağrının kendisi iptal edilse de analiz bekleyenler için tamamlanmalı
+            cancelled = asyncio.ensure_future(bridge.aanalyze_batch(second))
+            await asyncio.sleep(0.02)
+            waiter = asyncio.ensure_future(bridge.aanalyze_batch(second))
+            cancelled.cancel()
+            return await claimer, await sync_waiter, await waiter
+
+        claimed, waited, later = asyncio.run(main())
+        self.assertEqual({t: r["lemma"] for t, r in claimed.items()}, {t: t.lower() for t in first})
+        self.assertEqual(waited, claimed)
+        self.assertEqual({t: r["lemma"] for t, r in later.items()}, {t: t.lower() for t in second})
+        self.assertEqual(sorted(word for _, word in self.requests()), sorted(first + second))
+
+        prep = Preprocessor(engine="nuve")
+        tokens = ["Ankara", "Van", "Muş"]
+
+        async def sentences():
+            return await asyncio.gather(prep.aprocess_sentence(tokens), prep.aprocess_sentence(tokens))
+
+        rows, again = asyncio.run(sentences())
+        self.assertEqual(rows, again)
+        self.assertEqual(rows, prep.process_sentence(tokens))
+        self.assertEqual([row['lemma'] for row in rows], [t.lower() for t in tokens])
+
 
 class TestGazetteers(unittest.TestCase):
     """Gazetteer dosyaları testleri"""